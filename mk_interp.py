@@ -1,5 +1,6 @@
 from argparse import Namespace, ArgumentParser
 import json
+import re
 from typing import List, Dict, TextIO, Optional, NamedTuple, Any
 
 
@@ -19,7 +20,7 @@ class Operation(NamedTuple):
     operands: List[Operand]
     stack: Stack
     memory: Optional[Stack]
-    side_effects: Optional[str]
+    side_effects: Optional[List[str]]
 
 
 def get_args() -> Namespace:
@@ -27,6 +28,8 @@ def get_args() -> Namespace:
     ap.add_argument("--spec", required=True, help="The file to read")
     ap.add_argument("--ebnf", help="The ebnf file to write")
     ap.add_argument("--insns", help="The insns file to write")
+    ap.add_argument("--threaded", help="The threaded engine file to write")
+    ap.add_argument("--parser", help="The parser file to write")
     return ap.parse_args()
 
 
@@ -110,10 +113,13 @@ def regs(operation: Operation) -> List[str]:
 
 
 prol = """
-class Insn:
-    def execute(
-        self, memory: List[int], registers: Dict[str, int], labels: Dict[str, int]
-    ) -> None:
+@dataclass
+class Insn(Generic[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ()
+
+    def execute(self, memory: Memory, registers: Registers, output: Output) -> None:
         raise NotImplementedError(f"execute not implemented for {self.__class__}")
 
     def disasm(self, long: bool = False) -> str:
@@ -129,7 +135,8 @@ def gen_classes(f: TextIO, spec: List[Operation]):
 
 def gen_class(f: TextIO, operation: Operation):
     f.write("@dataclass\n")
-    f.write(f"class {operation.cls}(Insn):\n")
+    f.write(f"class {operation.cls}(Insn[Ref]):\n")
+    gen_class_roles(f, operation)
     gen_class_fields(f, operation)
     gen_class_execute_method(f, operation)
     gen_class_disasm_method(f, operation)
@@ -158,43 +165,67 @@ def gen_class_disasm_method(f: TextIO, operation: Operation):
     f.write(ret)
 
 
-def gen_class_execute_method(f: TextIO, operation: Operation):
+def translate(
+    operation: Operation, names: Dict[str, str], result: str = "{}"
+) -> List[str]:
+    # The operation's semantics as Python statements.  Every name the spec
+    # uses (dst, register roles, operands, PC, RA) is replaced by names[name],
+    # and the value assigned to dst is formatted through `result`.
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b")
+
     def embellish(s: str) -> str:
-        for reg in ["PC", "RA"]:
-            s = s.replace(f"{reg}", f"registers['{reg}']")
-        for reg in operation.stack.before:
-            s = s.replace(f"{reg}", f"registers[self.{reg}]")
-        for x in operation.operands:
-            if x.name == "label":
-                s = s.replace("label", "labels[self.label]")
-            else:
-                s = s.replace(f"{x.name}", f"self.{x.name}")
-        return s
+        return pattern.sub(lambda m: names[m.group(1)], s) if names else s
 
-    f.write(
-        f"    def execute(self, memory:Memory, registers:Registers, labels:Labels) -> None:\n"
-    )
-    if not (operation.stack.after or operation.side_effects):
-        f.write("        pass\n")
+    stmts: List[str] = []
     if operation.stack.after:
         assert len(operation.stack.after) == 1
         e = embellish(operation.stack.after[0])
-        f.write(f"        registers[self.dst] = {e}\n")
+        stmts.append(f"{names['dst']} = {result.format(e)}")
     if operation.side_effects:
         for se in operation.side_effects:
-            e = embellish(se)
-            f.write(f"        {e}\n")
+            stmts.append(embellish(se))
+    return stmts
+
+
+def gen_class_execute_method(f: TextIO, operation: Operation):
+    names = {reg: f"registers[{reg}]" for reg in ["PC", "RA"]}
+    for reg in regs(operation):
+        names[reg] = f"registers[self.{reg}]"
+    for x in operation.operands:
+        names[x.name] = f"self.{x.name}"
+
+    f.write(
+        f"    def execute(self:'{operation.cls}[int]', memory:Memory, "
+        f"registers:Registers, "
+        f"output:Output) -> None:\n"
+    )
+    stmts = translate(operation, names)
+    if not stmts:
+        f.write("        pass\n")
+    for stmt in stmts:
+        f.write(f"        {stmt}\n")
     f.write("\n")
 
 
+def gen_class_roles(f: TextIO, operation: Operation):
+    defs = ["dst"] if operation.stack.after else []
+    uses = operation.stack.before
+    targets = [x.name for x in operation.operands if x.name == "label"]
+    f.write(f"    defs: ClassVar[Tuple[str, ...]] = {tuple(defs)}\n")
+    f.write(f"    uses: ClassVar[Tuple[str, ...]] = {tuple(uses)}\n")
+    f.write(f"    targets: ClassVar[Tuple[str, ...]] = {tuple(targets)}\n")
+
+
 def gen_class_fields(f: TextIO, operation: Operation):
     if operation.stack.after:
         assert len(operation.stack.after) == 1, operation.stack.after
-        f.write("    dst:str\n")
+        f.write("    dst:Ref\n")
     for reg in operation.stack.before:
-        f.write(f"    {reg}: str\n")
+        f.write(f"    {reg}: Ref\n")
     for operand in operation.operands:
-        f.write(f"    {operand.name}:{operand.type}\n")
+        # labels are linked to PCs like registers to slots
+        kind = "Ref" if operand.name == "label" else operand.type
+        f.write(f"    {operand.name}:{kind}\n")
     f.write("    comment: str = ''\n")
 
 
@@ -202,19 +233,28 @@ def gen_insns(args: Namespace, spec: List[Operation]):
     if not args.insns:
         return
     prologue = """
-from typing import List, Dict, NoReturn, TypeAlias
+from typing import Callable, ClassVar, Generic, List, Dict, MutableSequence, Tuple, TypeAlias, TypeVar
 from dataclasses import dataclass
 
-Registers:TypeAlias = Dict[str, int]
-Labels:TypeAlias = Dict[str, int]
-Memory:TypeAlias = List[int]
+# Register and label operands: names as parsed, register-file slots and
+# PCs once linked.  Only linked instructions execute.
+Ref = TypeVar("Ref", int, str)
+
+Registers:TypeAlias = List[int]
+Memory:TypeAlias = MutableSequence[int]
+# receives each value Print prints
+Output:TypeAlias = Callable[[int], None]
+
+# Registers every program has, in register-file order.
+special_registers = ["PC", "FP", "SP", "RA"]
+PC, FP, SP, RA = range(len(special_registers))
+
+# PC value that stops execution
+HALT = -1
 
 @dataclass
 class VM_Error(Exception):
     msg:str
-
-def halt() -> NoReturn:
-    raise VM_Error("Halt")
 """
     with open(args.insns, "w") as f:
         f.write(prologue)
@@ -223,6 +263,180 @@ def halt() -> NoReturn:
         gen_reserved(f, spec)
 
 
+threaded_prologue = """
+from typing import Callable, Dict, List, TypeAlias
+
+from .vm_insns import *
+
+# A thunk executes one pre-linked instruction.  It receives the PC of the
+# following instruction and returns the PC to continue at.
+Thunk: TypeAlias = Callable[[int], int]
+"""
+
+threaded_epilogue = """
+def synced(
+    insn: Insn[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    # An instruction naming PC as a register operand sees and sets
+    # registers[PC] as the interpreter keeps it.
+    def op(pc: int) -> int:
+        registers[PC] = pc
+        insn.execute(memory, registers, output)
+        return registers[PC]
+
+    return op
+
+
+def thread(
+    insns: List[Insn], memory: Memory, registers: Registers, output: Output
+) -> List[Thunk]:
+    return [
+        synced(insn, memory, registers, output)
+        if PC in [getattr(insn, field) for field in insn.defs + insn.uses]
+        else threaders[type(insn)](insn, memory, registers, output)
+        for insn in insns
+    ]
+"""
+
+
+def gen_thread_function(f: TextIO, operation: Operation):
+    names = {"PC": "pc", "RA": "registers[RA]"}
+    for reg in regs(operation):
+        names[reg] = f"registers[{reg}]"
+
+    f.write(
+        f"def thread_{operation.cls}(insn:{operation.cls}[int], memory:Memory, "
+        f"registers:Registers, output:Output) -> Thunk:\n"
+    )
+    for reg in regs(operation):
+        f.write(f"    {reg} = insn.{reg}\n")
+    for operand in operation.operands:
+        f.write(f"    {operand.name} = insn.{operand.name}\n")
+    f.write("    def op(pc:int) -> int:\n")
+    for stmt in translate(operation, names):
+        f.write(f"        {stmt}\n")
+    f.write("        return pc\n")
+    f.write("    return op\n\n")
+
+
+def gen_threaded(args: Namespace, spec: List[Operation]):
+    if not args.threaded:
+        return
+    with open(args.threaded, "w") as f:
+        f.write(threaded_prologue)
+        for operation in spec:
+            gen_thread_function(f, operation)
+        f.write("threaders: Dict[type, Callable[..., Thunk]] = {\n")
+        for operation in spec:
+            f.write(f"    {operation.cls}: thread_{operation.cls},\n")
+        f.write("}\n")
+        f.write(threaded_epilogue)
+
+
+parser_prologue = """
+from typing import (
+    Callable, Dict, Iterator, List, NoReturn, Set, Tuple, TypeAlias
+)
+
+from .vm_insns import *
+from .scanner import Token, Scanner
+
+
+class ParseErrorException(Exception):
+    msg: str
+    token: Token
+    expected: Set[str]
+
+    def __init__(self, msg: str, current: Token, expected: Set[str]):
+        self.msg = msg
+        self.current = current
+        self.expected = expected
+
+    def __str__(self):
+        return f"Parse error {self.msg} at {self.current}:  Expected {self.expected}"
+
+
+# An operation is its keyword, then its operands each optionally followed by
+# a comma, then an optional comment string.  The table maps each keyword to
+# the constructor and the token kinds of its operands.
+Syntax: TypeAlias = Tuple[Callable[..., Insn], Tuple[str, ...]]
+
+"""
+
+parser_epilogue = """
+# tokens that may follow an operation
+follow: Set[str] = set(syntax) | {"EOF"}
+
+
+class Parser:
+    def __init__(self, scanner: Scanner):
+        self.scanner: Scanner = scanner
+
+    def error(self, msg: str, expected: Set[str]) -> NoReturn:
+        current: Token = self.scanner.peek()
+        raise ParseErrorException(msg, current, expected)
+
+    def match(self, kind: str) -> Token:
+        if self.current() == kind:
+            return self.scanner.consume()
+        else:
+            self.error("", {kind})
+
+    def current(self) -> str:
+        return self.scanner.peek().kind
+
+    def parse(self) -> List[Insn]:
+        return list(self.stream())
+
+    def stream(self) -> Iterator[Insn]:
+        # start -> { operation }, handing each operation over as it is parsed
+        while self.current() in syntax:
+            yield self._operation()
+        self.match("EOF")
+
+    def _operation(self) -> Insn:
+        cls, kinds = syntax[self.scanner.consume().kind]
+        values: List[object] = []
+        for kind in kinds:
+            value = self.match(kind).value
+            values.append(int(value) if kind == "INT" else value)
+            if self.current() == ",":
+                self.scanner.consume()
+        if self.current() == "STR":
+            values.append(self.scanner.consume().value)
+        elif self.current() in follow:
+            values.append("")
+        else:
+            self.error("syntax error", follow | {"STR"})
+        return cls(*values)
+"""
+
+type_to_token = {
+    "int": "INT",
+    "str": "STR",
+}
+
+
+def gen_parser(args: Namespace, spec: List[Operation]):
+    if not args.parser:
+        return
+    with open(args.parser, "w") as f:
+        f.write(parser_prologue)
+        f.write("syntax: Dict[str, Syntax] = {\n")
+        for operation in spec:
+            kinds = ["ID" for _ in regs(operation)]
+            kinds += [type_to_token[op.type] for op in operation.operands]
+            schema = ", ".join(f'"{kind}"' for kind in kinds)
+            schema += "," if len(kinds) == 1 else ""
+            for keyword in (operation.cls, operation.short):
+                if keyword:
+                    f.write(
+                        f'    "{keyword}": ({operation.cls}, ({schema})),\n'
+                    )
+        f.write("}\n")
+        f.write(parser_epilogue)
+
+
 def convert_spec(js: List[Dict[str, Any]]) -> List[Operation]:
     operations: List[Operation] = []
     operation: Dict[str, Any]
@@ -263,14 +477,20 @@ def convert_spec(js: List[Dict[str, Any]]) -> List[Operation]:
     return operations
 
 
+def load_spec(path: str) -> List[Operation]:
+    # read path as json file
+    with open(path) as f:
+        return convert_spec(json.load(f))
+
+
 def main():
     args = get_args()
-    # read args.spec as json file
-    with open(args.spec) as f:
-        spec: List[Operation] = convert_spec(json.load(f))
+    spec: List[Operation] = load_spec(args.spec)
 
     gen_ebnf(args, spec)
     gen_insns(args, spec)
+    gen_threaded(args, spec)
+    gen_parser(args, spec)
 
 
 if __name__ == "__main__":
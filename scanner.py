@@ -1,5 +1,17 @@
+import functools
+import itertools
+import re
 import string
-from typing import NamedTuple, List
+from typing import (
+    FrozenSet,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    List,
+    Pattern,
+    TextIO,
+    Tuple,
+)
 import sys
 
 
@@ -14,6 +26,46 @@ def error(line: int, msg: str):
     sys.exit(1)
 
 
+@functools.lru_cache(maxsize=None)
+def pattern(punctuation: Tuple[str, ...]) -> Pattern[str]:
+    # each match is optional blanks and comments followed by one token, a
+    # newline, BAD for a character no token can start with, or the end of
+    # the input; punctuation keeps its list order so the first listed match
+    # wins
+    blanks = "".join(c for c in string.whitespace if c != "\n")
+    skip = rf"(?:[{re.escape(blanks)}]+|//[^\n]*)*"
+    alternatives = [
+        r"(?P<NL>\n)",
+        r"\"(?P<STR>[^\"\n]*)\"",
+        r"'(?P<STR1>[^'\n]*)'",
+        r"(?P<ID>[A-Za-z][A-Za-z0-9]*)",
+        r"(?P<INT>-?[0-9]+)",
+    ]
+    if punctuation:
+        exact = "|".join(re.escape(p) for p in punctuation)
+        alternatives.append(f"(?P<PUNCT>{exact})")
+    alternatives += [r"(?P<BAD>.)", r"(?P<END>\Z)"]
+    return re.compile(f"{skip}(?:{'|'.join(alternatives)})", re.DOTALL)
+
+
+def chunks(file: TextIO, size: int = 1 << 16) -> Iterator[str]:
+    # the file in pieces of about size characters that end at a newline
+    pending: List[str] = []
+    while True:
+        data = file.read(size)
+        if not data:
+            break
+        cut = data.rfind("\n") + 1
+        if cut == 0:
+            pending.append(data)
+            continue
+        pending.append(data[:cut])
+        yield "".join(pending)
+        pending = [data[cut:]]
+    if any(pending):
+        yield "".join(pending)
+
+
 class Scanner:
     def __init__(
         self, input: str, reserved: List[str] = [], punctuation: List[str] = []
@@ -24,83 +76,38 @@ class Scanner:
         self.tokens: list[Token] = self.scan(input)
 
     def scan(self, input: str) -> List[Token]:
-        retval: List[Token] = []
-        index: int = 0
-        lineno: int = 1
-        t: Token = Token("", "", -1)
+        return list(self.tokenize([input]))
 
-        while index < len(input):
-            ch = input[index]
-            if ch == "\n":
+    def tokenize(self, pieces: Iterable[str]) -> Iterator[Token]:
+        # pieces must not split a line, which no token spans
+        lineno: int = 1
+        reserved: FrozenSet[str] = frozenset(self.reserved)
+        compiled: Pattern[str] = pattern(tuple(self.punctuation))
+        for m in itertools.chain.from_iterable(
+            compiled.finditer(piece) for piece in pieces
+        ):
+            kind = m.lastgroup
+            assert kind is not None  # every alternative is a named group
+            value = m.group(kind)
+            if kind == "ID":
+                if value in reserved:
+                    yield Token(value, value, lineno)
+                else:
+                    yield Token("ID", value, lineno)
+            elif kind == "NL":
                 lineno += 1
-                index += 1
-            elif (
-                ch == "/"
-                and index < len(input) - 1
-                and input[index + 1] == "/"
-            ):
-                index += 2  # skip both /'s
-                while index < len(input) and input[index] != "\n":
-                    index += 1
-            elif ch in string.whitespace:
-                index += 1
-            elif ch == '"' or ch == "'":
-                delimiter = ch
-                value = ""
-                index += 1
-                while (
-                    index < len(input)
-                    and input[index] != delimiter
-                    and input[index] != "\n"
-                ):
-                    value += input[index]
-                    index += 1
-                if index == len(input) or input[index] == "\n":
+            elif kind == "INT":
+                yield Token("INT", value, lineno)
+            elif kind == "STR" or kind == "STR1":
+                yield Token("STR", value, lineno)
+            elif kind == "PUNCT":
+                yield Token(value, value, lineno)
+            elif kind == "BAD":
+                if value == '"' or value == "'":
                     error(lineno, "Unterminated string")
-                t = Token("STR", value, lineno)
-                retval.append(t)
-                index += 1
-            elif ch in string.ascii_letters:
-                value = ""
-                while index < len(input) and input[index] in (
-                    string.ascii_letters + string.digits
-                ):
-                    value += input[index]
-                    index += 1
-                if value in self.reserved:
-                    t = Token(value, value, lineno)
-                else:
-                    t = Token("ID", value, lineno)
-                retval.append(t)
-            elif ch in string.digits or ch == "-":
-                if ch == "-":
-                    index += 1
-                    value = "-"
-                else:
-                    value = ""
-                while index < len(input) and input[index] in string.digits:
-                    value += input[index]
-                    index += 1
                 assert value != "-", "Missing integer literal after -"
-                t = Token("INT", value, lineno)
-                retval.append(t)
-            else:
-                found: bool = False
-                for exact in self.punctuation:
-                    if (
-                        index + len(exact) <= len(input)
-                        and exact == input[index : index + len(exact)]
-                    ):
-                        t = Token(exact, exact, lineno)
-                        index += len(exact)
-                        found = True
-                        break
-                if not found:
-                    assert False, f"{lineno}: unexpected character, '{ch}'"
-                retval.append(t)
-        t: Token = Token("EOF", "", lineno)
-        retval.append(t)
-        return retval
+                assert False, f"{lineno}: unexpected character, '{value}'"
+        yield Token("EOF", "", lineno)
 
     def peek(self) -> Token:
         return self.tokens[self.index]
@@ -109,3 +116,28 @@ class Scanner:
         t = self.peek()
         self.index += 1
         return t
+
+
+class StreamScanner(Scanner):
+    # scans a file a chunk at a time as the parser asks for tokens, keeping
+    # only the next token
+    def __init__(
+        self,
+        file: TextIO,
+        reserved: List[str] = [],
+        punctuation: List[str] = [],
+        size: int = 1 << 16,
+    ):
+        self.reserved = reserved
+        self.punctuation = punctuation
+        self.stream: Iterator[Token] = self.tokenize(chunks(file, size))
+        self.next: Token = next(self.stream)
+
+    def peek(self) -> Token:
+        return self.next
+
+    def consume(self) -> Token:
+        t = self.next
+        if t.kind != "EOF":
+            self.next = next(self.stream)
+        return t
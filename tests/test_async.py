@@ -0,0 +1,72 @@
+import asyncio
+from typing import List, Optional
+
+from .. import vm_async, vm_memory, vm_output
+from ..scanner import Scanner
+from ..vm import Execution, engines
+from ..vm_insns import reserved
+from ..vm_parser import Parser
+
+# prints 1 to n, one per loop trip
+count = """
+imm one 1
+imm i 0
+lab "loop"
+addi i i 1
+print i
+lt t i n
+jnz t "loop"
+halt
+"""
+
+# prints, then divides by zero
+fault = """
+imm a 7
+print a
+imm z 0
+div b a z
+halt
+"""
+
+
+def execution(
+    source: str, engine: str, output: Optional[vm_output.Sink] = None
+) -> Execution:
+    insns = Parser(Scanner(source, reserved=reserved)).parse()
+    regs = {"SP": 1, "n": 50}
+    memory = vm_memory.allocate([0])
+    return Execution(insns, memory, regs, engine, output=output)
+
+
+def test_jobs_keep_their_output_apart():
+    async def main() -> List[Optional[BaseException]]:
+        host = vm_async.Host(7)
+        jobs = [host.start(execution(count, engine)) for engine in engines]
+        # a coroutine printing while the VMs run
+        for _ in range(20):
+            print("elsewhere")
+            await asyncio.sleep(0)
+        results = await host.join()
+        for job in jobs:
+            assert job.output == [f"{i}\n" for i in range(1, 51)]
+            assert job.slices > 1
+        return results
+
+    assert asyncio.run(main()) == [None] * len(engines)
+
+
+def test_output_before_a_fault_reaches_the_sink():
+    lines: List[str] = []
+
+    async def sink(line: str) -> None:
+        lines.append(line)
+
+    async def main() -> List[Optional[BaseException]]:
+        host = vm_async.Host()
+        # the job replaces whatever sink the Execution was built with
+        host.start(execution(fault, "compiled", vm_output.PrintSink()), sink)
+        return await host.join()
+
+    (raised,) = asyncio.run(main())
+    assert isinstance(raised, ZeroDivisionError)
+    assert lines == ["7\n"]
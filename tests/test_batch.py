@@ -0,0 +1,57 @@
+from typing import List
+
+import pytest
+
+from .. import vm_batch
+from ..scanner import Scanner
+from ..vm_insns import Insn, reserved
+from ..vm_parser import Parser
+
+# prints the square of its argument and leaves it in the result cell;
+# divides by the argument first, so 0 raises
+square = """
+addi p SP -2
+ld a p
+div d a a
+mul b a a
+print b
+addi q SP -1
+st q b
+halt
+"""
+
+vectors = [[n] for n in range(-20, 21)]
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+def expected(position: int, args: List[int]) -> vm_batch.Result:
+    (n,) = args
+    if n == 0:
+        error = "ZeroDivisionError: integer division or modulo by zero"
+        return vm_batch.Result(position, args, "", 0, error)
+    return vm_batch.Result(position, args, f"{n * n}\n", n * n, "")
+
+
+@pytest.mark.parametrize("engine", ["interp", "compiled"])
+def test_ordered_results_come_in_input_order(engine: str):
+    results = list(
+        vm_batch.run_batch(
+            parse(square), vectors, jobs=2, chunk=3, engine=engine
+        )
+    )
+    assert results == [expected(i, v) for i, v in enumerate(vectors)]
+
+
+def test_unordered_results_cover_every_vector():
+    results = vm_batch.run_batch(
+        parse(square), vectors, jobs=3, ordered=False, chunk=2
+    )
+    assert sorted(results) == [expected(i, v) for i, v in enumerate(vectors)]
+
+
+def test_worker_setup_errors_are_raised_as_themselves():
+    with pytest.raises(Exception, match="64-bit semantics"):
+        list(vm_batch.run_batch(parse(square), vectors, int64=True))
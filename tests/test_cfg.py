@@ -0,0 +1,105 @@
+from typing import List
+
+from .. import vm_cfg
+from ..scanner import Scanner
+from ..vm_insns import Insn, reserved
+from ..vm_parser import Parser
+
+diamond = """
+ld a SP
+jz a "else"
+imm b 1
+j "join"
+lab "else"
+imm b 2
+lab "join"
+print b
+halt
+"""
+
+nested = """
+imm i 0
+imm n 3
+lab "outer"
+imm k 0
+lab "inner"
+addi k k 1
+lt t k n
+jnz t "inner"
+addi i i 1
+lt t i n
+jnz t "outer"
+halt
+"""
+
+call = """
+imm a 3
+call "square"
+print v
+halt
+lab "square"
+mul v a a
+ji RA
+"""
+
+
+def cfg(source: str) -> vm_cfg.CFG:
+    insns: List[Insn] = Parser(Scanner(source, reserved=reserved)).parse()
+    return vm_cfg.CFG(insns)
+
+
+def test_diamond():
+    graph = cfg(diamond)
+    then, other, join = 1, graph.block_of("else"), graph.block_of("join")
+    assert graph.blocks[0].succs == [other, then]
+    assert sorted(graph.blocks[join].preds) == sorted([then, other])
+    idom = vm_cfg.dominators(graph)
+    assert idom == {0: 0, then: 0, other: 0, join: 0}
+    assert not vm_cfg.dominates(idom, then, join)
+    assert vm_cfg.loops(graph, idom) == []
+    live = vm_cfg.liveness(graph)
+    assert "b" in live.live_in[join]
+    assert "b" in live.live_out[then] and "b" in live.live_out[other]
+    assert "b" not in live.live_in[0]
+    assert "a" in live.live_after(0) and "a" not in live.live_out[0]
+
+
+def test_nested_loops():
+    graph = cfg(nested)
+    outer, inner = graph.block_of("outer"), graph.block_of("inner")
+    latch = inner + 1
+    idom = vm_cfg.dominators(graph)
+    assert idom[inner] == outer and idom[latch] == inner
+    found = vm_cfg.loops(graph, idom)
+    assert [(loop.header, loop.blocks) for loop in found] == [
+        (outer, {outer, inner, latch}),
+        (inner, {inner}),
+    ]
+    assert found[1].parent is found[0] and found[0].children == [found[1]]
+    depths = vm_cfg.loop_depths(graph, found)
+    assert (depths[0], depths[outer], depths[inner], depths[latch]) == (
+        0,
+        1,
+        2,
+        1,
+    )
+    live = vm_cfg.liveness(graph)
+    assert {"i", "k", "n"} <= live.live_in[inner]
+    assert "k" not in live.live_in[outer]
+    assert "t" not in live.live_in[inner]
+
+
+def test_call_and_return():
+    graph = cfg(call)
+    after, callee = 1, graph.block_of("square")
+    # the call reaches the callee and, standing for its return, the next
+    # block; the return reaches every return site
+    assert graph.blocks[0].succs == [callee, after]
+    assert graph.blocks[callee].succs == [after]
+    idom = vm_cfg.dominators(graph)
+    assert idom[after] == 0 and idom[callee] == 0
+    assert vm_cfg.loops(graph, idom) == []
+    live = vm_cfg.liveness(graph)
+    assert {"a", "RA"} <= live.live_in[callee]
+    assert "v" in live.live_out[callee]
+    assert "a" not in live.live_in[after]
@@ -0,0 +1,84 @@
+import types
+from typing import List
+
+import pytest
+
+from .. import vm_link, vm_memory, vm_output, vm_transpile
+from ..scanner import Scanner
+from ..vm import Execution, engines
+from ..vm_insns import Insn, reserved
+from ..vm_parser import Parser
+
+# PC read as an ordinary register: the address of the next instruction
+read_pc = """
+imm a 5
+move x PC
+print x
+llabel f "here"
+print f
+lab "here"
+call "sub"
+print RA
+halt
+lab "sub"
+ji RA
+"""
+
+# PC written as an ordinary register jumps
+write_pc = """
+imm one 1
+llabel t "skip"
+move PC t
+imm one 99
+lab "skip"
+print one
+halt
+"""
+
+# PC added to, as a relative jump over the next instruction
+relative = """
+imm one 1
+imm n 7
+add PC PC one
+imm n 99
+print n
+halt
+"""
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+def run(source: str, engine: str) -> List[int]:
+    output = vm_output.ListSink()
+    exe = Execution(
+        parse(source),
+        vm_memory.allocate([0]),
+        {"SP": 1},
+        engine=engine,
+        output=output,
+    )
+    exe.run()
+    return output.values
+
+
+@pytest.mark.parametrize("engine", engines)
+@pytest.mark.parametrize("source", [read_pc, write_pc, relative])
+def test_engine_matches_interpreter(source: str, engine: str):
+    assert run(source, engine) == run(source, "interp")
+
+
+@pytest.mark.parametrize("source", [read_pc, write_pc, relative])
+def test_transpiled_matches_interpreter(source: str):
+    output = vm_output.ListSink()
+    module = types.ModuleType("transpiled")
+    exec(vm_transpile.transpile(vm_link.link(parse(source))), module.__dict__)
+    vm_transpile.execute(module, vm_memory.allocate([0]), {"SP": 1}, output)
+    assert output.values == run(source, "interp")
+
+
+def test_pc_operands():
+    assert run(read_pc, "interp") == [2, 5, 6]
+    assert run(write_pc, "interp") == [1]
+    assert run(relative, "interp") == [7]
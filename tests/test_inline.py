@@ -0,0 +1,97 @@
+from collections import Counter
+from typing import List, Tuple
+
+import pytest
+
+from .. import vm_inline, vm_memory, vm_optimize
+from ..scanner import Scanner
+from ..vm_insns import Call, Halt, Insn, JumpIndirect, LoadLabel, reserved
+from ..vm_parser import Parser
+
+# leaves the argument, not known until run time, in a
+arg = """
+addi p SP -1
+ld a p
+"""
+
+# a leaf with two returns
+leaf = """
+call "abs"
+print v
+call "abs"
+print v
+halt
+lab "abs"
+move v a
+lt t a zero
+jz t "done"
+neg v a
+ji RA
+lab "done"
+ji RA
+"""
+
+# saves RA around a call of its own, so it is copied with RA set
+nested = """
+call "twice"
+print w
+halt
+lab "twice"
+st SP RA
+addi SP SP 1
+call "square"
+add w v v
+addi SP SP -1
+ld RA SP
+ji RA
+lab "square"
+mul v a a
+ji RA
+"""
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+def inline(
+    source: str, value: int, budget: int = 256
+) -> Tuple[List[Insn], Counter[str]]:
+    insns = parse(arg + "imm zero 0\n" + source)
+    inliner = vm_inline.Inliner(budget=budget)
+    inlined = inliner.run(insns)
+    vm_optimize.verify(
+        insns, inlined, lambda: vm_memory.allocate([value]), {"SP": 1}
+    )
+    return inlined, inliner.stats
+
+
+@pytest.mark.parametrize("value", [-4, 0, 9])
+def test_leaf_calls_and_returns_go(value: int):
+    result, stats = inline(leaf, value)
+    assert stats["inlined"] == 2
+    assert stats["call-removed"] == 2
+    # the subroutine itself stays after the Halt
+    main = result[: result.index(Halt())]
+    assert not any(isinstance(x, (Call, JumpIndirect)) for x in main)
+
+
+@pytest.mark.parametrize("value", [-4, 0, 9])
+def test_non_leaf_returns_through_ra(value: int):
+    result, stats = inline(nested, value)
+    assert stats["inlined"] >= 1
+    assert any(isinstance(x, LoadLabel) and x.dst == "RA" for x in result)
+
+
+def test_budget_limits_growth():
+    _, stats = inline(leaf, 3, budget=0)
+    assert stats["inlined"] == 0
+    assert stats["over-budget"] == 2
+
+
+def test_programs_writing_pc_are_left_alone():
+    insns = parse(
+        'llabel t "skip"\nmove PC t\ncall "f"\nlab "skip"\nhalt\n'
+        'lab "f"\nji RA'
+    )
+    assert vm_inline.Inliner().run(insns) == insns
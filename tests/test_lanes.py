@@ -0,0 +1,106 @@
+from typing import List
+
+import pytest
+
+from .. import vm_lanes
+from ..scanner import Scanner
+from ..vm_batch import Worker
+from ..vm_insns import Insn, reserved
+from ..vm_parser import Parser
+
+pytest.importorskip("numpy")
+
+# each reads its argument at SP-2 and leaves its result at SP-1
+fib = """
+addi p SP -2
+ld a0 p
+imm two 2
+call "fib"
+addi q SP -1
+st q v0
+print v0
+halt
+lab "fib"
+lt t a0 two
+jz t "recurse"
+move v0 a0
+ji RA
+lab "recurse"
+st SP RA
+addi SP SP 1
+st SP a0
+addi SP SP 1
+addi a0 a0 -1
+call "fib"
+addi SP SP -1
+ld a0 SP
+st SP v0
+addi SP SP 1
+addi a0 a0 -2
+call "fib"
+addi SP SP -1
+ld t SP
+add v0 v0 t
+addi SP SP -1
+ld RA SP
+ji RA
+"""
+
+# picks a function through a register by the argument's parity
+indirect = """
+addi p SP -2
+ld n p
+imm two 2
+div h n two
+mul h h two
+sub odd n h
+llabel f "even"
+jz odd "chosen"
+llabel f "odd"
+lab "chosen"
+calli f
+addi q SP -1
+st q r
+print r
+halt
+lab "even"
+mul r n n
+ji RA
+lab "odd"
+neg r n
+ji RA
+"""
+
+# divides by the argument minus 3, then loads from the quotient's address
+faults = """
+addi p SP -2
+ld n p
+imm three 3
+sub d n three
+imm k 12000
+div r k d
+print r
+ld r r
+addi q SP -1
+st q r
+halt
+"""
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+@pytest.mark.parametrize(
+    "source, vectors",
+    [
+        (fib, [[n] for n in range(12)]),
+        (indirect, [[n] for n in range(-4, 5)]),
+        (faults, [[n] for n in range(-2, 8)] + [[4000], [-9000]]),
+    ],
+)
+def test_lanes_match_interpreter(source: str, vectors: List[List[int]]):
+    insns = parse(source)
+    worker = Worker(insns, memory_size=vm_lanes.default_size)
+    expected = [worker.run(i, args) for i, args in enumerate(vectors)]
+    assert vm_lanes.run_lanes(insns, vectors) == expected
@@ -0,0 +1,90 @@
+from typing import List
+
+import pytest
+
+from .. import vm_limits, vm_memory, vm_output
+from ..scanner import Scanner
+from ..vm import Execution, engines
+from ..vm_insns import Insn, Memory, reserved
+from ..vm_parser import Parser
+
+# loops forever at source index 3, after a Noop and a Label linking drops
+forever = """
+imm a 1
+noop
+lab "top"
+j "top"
+"""
+
+# stores at every 16th address upwards, touching a new page every so often
+grow = """
+imm step 16
+imm v 1
+lab "top"
+st p v
+add p p step
+j "top"
+"""
+
+# counts to 100 and halts
+count = """
+imm one 1
+imm n 100
+imm i 0
+lab "top"
+add i i one
+lt t i n
+jnz t "top"
+print i
+halt
+"""
+
+
+def execution(source: str, engine: str, memory: Memory) -> Execution:
+    insns: List[Insn] = Parser(Scanner(source, reserved=reserved)).parse()
+    output = vm_output.ListSink()
+    return Execution(insns, memory, {"SP": 1}, engine, output=output)
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_step_limit(engine: str):
+    exe = execution(forever, engine, vm_memory.allocate([0]))
+    with pytest.raises(vm_limits.LimitExceeded) as raised:
+        exe.run_limited(vm_limits.Limits(steps=1000, interval=64))
+    assert raised.value.limit == "steps"
+    assert raised.value.steps == 1000
+    # the source index, not the linked PC
+    assert raised.value.pc == 3
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_deadline(engine: str):
+    exe = execution(forever, engine, vm_memory.allocate([0]))
+    with pytest.raises(vm_limits.LimitExceeded) as raised:
+        exe.run_limited(vm_limits.Limits(seconds=0.05))
+    assert raised.value.limit == "seconds"
+    assert raised.value.seconds >= 0.05
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_cell_limit_on_paged_memory(engine: str):
+    memory = vm_memory.allocate([0], kind="paged", page_size=64)
+    exe = execution(grow, engine, memory)
+    with pytest.raises(vm_limits.LimitExceeded) as raised:
+        exe.run_limited(vm_limits.Limits(cells=640, interval=16))
+    assert raised.value.limit == "cells"
+    assert 640 < raised.value.cells <= 640 + 64 * 16
+
+
+def test_cell_limit_below_fixed_memory_is_rejected():
+    exe = execution(count, "interp", vm_memory.allocate([0], 1000))
+    with pytest.raises(Exception, match="use paged memory"):
+        exe.run_limited(vm_limits.Limits(cells=100))
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_program_within_limits_halts(engine: str):
+    exe = execution(count, engine, vm_memory.allocate([0]))
+    exe.run_limited(vm_limits.Limits(steps=1000, seconds=10, interval=7))
+    assert isinstance(exe.output, vm_output.ListSink)
+    assert exe.output.values == [100]
@@ -0,0 +1,78 @@
+from typing import List
+
+import pytest
+
+from .. import vm_memory, vm_optimize
+from ..scanner import Scanner
+from ..vm_insns import Immediate, Insn, reserved
+from ..vm_parser import Parser
+
+# leaves the argument, not known until run time, in a
+arg = """
+addi p SP -1
+ld a p
+"""
+
+# a program exercising each rewrite, keyed by the rewrite's stats name
+programs = {
+    "fold": "imm b 6\nimm c 7\nmul d b c\nprint d\nhalt",
+    "constant": "imm b 6\nmove c b\nprint c\nhalt",
+    "immediate": "imm b 4\nadd c a b\nprint c\nhalt",
+    "branch": 'imm z 0\njnz z "x"\nprint a\nlab "x"\nprint z\nhalt',
+    "indirect": 'llabel f "sub"\ncalli f\nprint v\nhalt\nlab "sub"\n'
+    "move v a\nji RA",
+    "unreachable": 'j "x"\nprint a\nlab "x"\nhalt',
+    "dead": "imm b 1\nmul c a a\nprint a\nhalt",
+}
+
+# n is the same constant on both paths into the join
+join = """
+jz a "other"
+imm n 3
+j "join"
+lab "other"
+imm n 3
+print a
+lab "join"
+add m n n
+print m
+halt
+"""
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+def optimize(source: str, value: int) -> vm_optimize.Optimizer:
+    insns = parse(arg + source)
+    optimizer = vm_optimize.Optimizer()
+    optimized = optimizer.run(insns)
+    vm_optimize.verify(
+        insns, optimized, lambda: vm_memory.allocate([value]), {"SP": 1}
+    )
+    return optimizer
+
+
+@pytest.mark.parametrize("kind", sorted(programs))
+@pytest.mark.parametrize("value", [0, 5])
+def test_rewrite_keeps_behaviour(kind: str, value: int):
+    assert optimize(programs[kind], value).stats[kind] > 0
+
+
+@pytest.mark.parametrize("value", [0, 5])
+def test_constants_meet_at_a_join(value: int):
+    insns = parse(arg + join)
+    optimized = vm_optimize.Optimizer().run(insns)
+    assert Immediate("m", 6) in optimized
+    vm_optimize.verify(
+        insns, optimized, lambda: vm_memory.allocate([value]), {"SP": 1}
+    )
+
+
+def test_programs_writing_pc_are_left_alone():
+    insns = parse(
+        'imm one 1\nllabel t "skip"\nmove PC t\nimm one 99\nlab "skip"\n'
+        "print one\nhalt"
+    )
+    assert vm_optimize.Optimizer().run(insns) == insns
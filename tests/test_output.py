@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+from array import array
+
+import pytest
+
+from .. import vm_memory, vm_output
+from ..scanner import Scanner
+from ..vm import Execution, engines
+from ..vm_insns import reserved
+from ..vm_parser import Parser
+
+values = [3, -1, 0, 1 << 40]
+
+# prints the values above, then 1 << 70 if asked to
+program = """
+imm a 3
+print a
+imm a -1
+print a
+imm a 0
+print a
+imm a 1099511627776
+print a
+jz big "done"
+imm a 1180591620717411303424
+print a
+lab "done"
+halt
+"""
+
+
+def run(sink: vm_output.Sink, engine: str = "interp", big: int = 0) -> None:
+    insns = Parser(Scanner(program, reserved=reserved)).parse()
+    memory = vm_memory.allocate([0])
+    regs = {"SP": 1, "big": big}
+    Execution(insns, memory, regs, engine, output=sink).run()
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_print_sink_writes_a_line_per_value(engine: str, capsys):
+    run(vm_output.PrintSink(), engine)
+    assert capsys.readouterr().out == "".join(f"{v}\n" for v in values)
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_list_sink_keeps_values(engine: str):
+    sink = vm_output.ListSink()
+    run(sink, engine)
+    assert sink.values == values
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_text_sink_writes_decimal_lines_in_batches(engine: str):
+    stream = io.StringIO()
+    sink = vm_output.TextSink(stream, buffer=3)
+    for value in values[:3]:
+        sink.write(value)
+    assert stream.getvalue() == "3\n-1\n0\n"
+    sink.write(values[3])
+    assert stream.getvalue() == "3\n-1\n0\n"
+    sink.flush()
+    assert stream.getvalue() == "".join(f"{v}\n" for v in values)
+    stream = io.StringIO()
+    run(vm_output.TextSink(stream), engine, big=1)
+    assert stream.getvalue() == "".join(f"{v}\n" for v in values + [1 << 70])
+
+
+def test_text_sink_without_stream_writes_to_stdout(capsys):
+    run(vm_output.TextSink())
+    assert capsys.readouterr().out == "".join(f"{v}\n" for v in values)
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_binary_sink_writes_native_int64s(engine: str):
+    stream = io.BytesIO()
+    run(vm_output.BinarySink(stream), engine)
+    assert stream.getvalue() == array("q", values).tobytes()
+
+
+def test_binary_sink_rejects_values_outside_64_bits():
+    stream = io.BytesIO()
+    with pytest.raises(OverflowError):
+        run(vm_output.BinarySink(stream), big=1)
+    # what was printed before still comes out
+    assert stream.getvalue() == array("q", values).tobytes()
+
+
+@pytest.mark.parametrize("kind", ["text", "binary"])
+def test_sink_closes_the_file_it_opened(kind: str, tmp_path):
+    path = os.path.join(tmp_path, "out")
+    sink = vm_output.sink(kind, path, buffer=2)
+    run(sink)
+    sink.close()
+    assert isinstance(sink, (vm_output.TextSink, vm_output.BinarySink))
+    assert sink.stream is not None and sink.stream.closed
+    with open(path, "rb") as f:
+        data = f.read()
+    if kind == "text":
+        assert data == "".join(f"{v}\n" for v in values).encode()
+    else:
+        assert data == array("q", values).tobytes()
+
+
+def test_sink_leaves_streams_it_was_given_open():
+    sink = vm_output.TextSink(sys.stdout)
+    sink.close()
+    assert not sys.stdout.closed
+
+
+def test_sink_rejects_bad_kinds():
+    with pytest.raises(Exception, match="stdout only"):
+        vm_output.sink("print", "out")
+    with pytest.raises(Exception, match="Unknown output kind"):
+        vm_output.sink("morse")
@@ -0,0 +1,62 @@
+from typing import List
+
+import pytest
+
+from .. import vm_memory, vm_optimize, vm_peephole
+from ..scanner import Scanner
+from ..vm_insns import Insn, reserved
+from ..vm_parser import Parser
+
+# leaves the argument, not known until run time, in a
+arg = """
+addi p SP -1
+ld a p
+"""
+
+# a program exercising each rule, keyed by the rule's stats name
+programs = {
+    "noop": "noop\nprint a\nhalt",
+    "copy": "move b a\nprint b\nhalt",
+    "self-move": "move a a\nprint a\nhalt",
+    "add-immediate": "imm b 4\nadd c a b\nsub d c b\nprint c\nprint d\nhalt",
+    "add-zero": "addi b a 0\nprint b\nhalt",
+    "constant-branch": 'imm z 0\njz z "x"\nprint a\nlab "x"\nprint z\nhalt',
+    "branch-test": 'imm z 0\neq t a z\njz t "x"\nprint a\nlab "x"\nhalt',
+    "dead": "imm b 1\nimm b 2\nimm c 3\nprint b\nhalt",
+    "thread": 'jz a "one"\nprint a\nlab "one"\nj "two"\nprint a\nlab "two"\n'
+    "halt",
+    "fallthrough": 'j "x"\nlab "x"\nprint a\nhalt',
+}
+
+
+def parse(source: str) -> List[Insn]:
+    return Parser(Scanner(source, reserved=reserved)).parse()
+
+
+@pytest.mark.parametrize("rule", sorted(programs))
+@pytest.mark.parametrize("value", [0, 5])
+def test_rule_keeps_behaviour(rule: str, value: int):
+    insns = parse(arg + programs[rule])
+    peephole = vm_peephole.Peephole()
+    optimized = peephole.run(insns)
+    assert peephole.stats[rule] > 0
+    vm_optimize.verify(
+        insns, optimized, lambda: vm_memory.allocate([value]), {"SP": 1}
+    )
+
+
+def test_copy_of_pc_is_not_propagated():
+    # PC read later is another value than the one copied
+    insns = parse("move x PC\nimm a 1\nprint a\nprint x\nhalt")
+    optimized = vm_peephole.Peephole().run(insns)
+    vm_optimize.verify(
+        insns, optimized, lambda: vm_memory.allocate([0]), {"SP": 1}
+    )
+
+
+def test_programs_writing_pc_are_left_alone():
+    insns = parse(
+        'imm one 1\nllabel t "skip"\nmove PC t\nimm one 99\n'
+        'lab "skip"\nprint one\nhalt'
+    )
+    assert vm_peephole.Peephole().run(insns) == insns
@@ -2,82 +2,245 @@ from typing import List, Dict, Optional
 import pprint
 import textwrap
 
+from . import (
+    vm_compile,
+    vm_limits,
+    vm_link,
+    vm_output,
+    vm_profile,
+    vm_regs,
+    vm_snapshot,
+    vm_threaded,
+    vm_trace,
+)
+
 from .vm_insns import *
 
+engines = ["interp", "threaded", "compiled"]
+
 
 class Execution:
     def __init__(
         self,
         insns: List[Insn],
-        memory: List[int],
+        memory: Memory,
         regs: Dict[str, int],
+        engine: str = "interp",
+        int64: bool = False,
+        output: Optional[vm_output.Sink] = None,
     ):
+        if engine not in engines:
+            raise Exception(f"Unknown engine: {engine}")
+        if int64 and engine != "compiled":
+            raise Exception("64-bit semantics need the compiled engine")
+        self.engine: str = engine
+        self.int64: bool = int64
         self.insns: List[Insn] = insns
-        self.memory: List[int] = memory
-        self.regs: Dict[str, int] = regs
-        if "FP" not in self.regs:
-            self.regs["FP"] = 0
-        if "SP" not in self.regs:
-            self.regs["SP"] = 0
-        if "PC" not in self.regs:
-            self.regs["PC"] = 0
-        self.labels: dict[str, int] = {}
-        for i, insn in enumerate(self.insns):
-            if isinstance(insn, Label):
-                label = insn.label
-                if label in self.labels:
-                    raise Exception(f"Duplicate label: {label}")
-                self.labels[label] = i
-
-        for insn in self.insns:
-            if hasattr(insn, "label"):
-                lab: str = getattr(insn, "label")
-                if lab not in self.labels:
-                    raise Exception(f"Undefined label: {lab}")
+        self.memory: Memory = memory
+        self.program: vm_link.Program = vm_link.link(insns, regs)
+        self.labels: Dict[str, int] = self.program.labels
+        self.regs: vm_regs.RegisterFile = vm_regs.RegisterFile(
+            self.program.slots, regs
+        )
+        self.registers: Registers = self.regs.cells
+        self.code: List[vm_threaded.Thunk] = []
+        self.compiler: Optional[vm_compile.Compiler] = None
+        self.blocks: List[vm_compile.Block] = []
+        if engine == "compiled":
+            self.compiler = vm_compile.Compiler(self.program, int64)
+        # where Print goes; flushed when a run ends
+        self.output: vm_output.Sink = output or vm_output.PrintSink()
+        self.redirect(self.output)
+        # instructions in the block at each PC, counted in slices
+        self.lengths: List[int] = []
 
         self.verbose = False
+        # checked between slices of the run when set
+        self.limits: Optional[vm_limits.Limits] = None
+        # instructions run by run_slice so far
+        self.steps: int = 0
+
+    def redirect(self, output: vm_output.Sink) -> None:
+        # the threaded and compiled engines bind output.write when built, so
+        # they are built again for the new sink
+        self.output = output
+        if self.engine == "threaded":
+            self.code = vm_threaded.thread(
+                self.program.insns, self.memory, self.registers, output.write
+            )
+        if self.compiler is not None:
+            self.blocks = self.compiler.compile(
+                self.memory, self.registers, output.write
+            )
 
     def __repr__(self) -> str:
         return f"Execution({self.insns}, {self.regs})"
 
     def dump_state(self) -> None:
-        insn = self.insns[self.regs["PC"]]
+        index = self.program.origin[self.regs["PC"]]
+        insn = self.insns[index]
         frame: list[int] = []
         caller: list[int] = []
         if self.regs["FP"] == 0:
-            frame = self.memory[self.regs["FP"] : self.regs["SP"]]
+            frame = list(self.memory[self.regs["FP"] : self.regs["SP"]])
             frame = frame[:20]
         else:
             start = self.memory[self.regs["FP"] + 1]
-            caller = self.memory[start : self.regs["FP"]]
-            frame = self.memory[self.regs["FP"] : self.regs["SP"]]
+            caller = list(self.memory[start : self.regs["FP"]])
+            frame = list(self.memory[self.regs["FP"] : self.regs["SP"]])
             frame = frame[:20]
         print(f"      regs  =")
         s = pprint.pformat(dict(self.regs), sort_dicts=False)
         print(textwrap.indent(s, " " * 14))
         print(f"      frame = {frame}")
         print(f"      caller= {caller}")
-        print(f"[{self.regs['PC']:4}] {insn}")
+        print(f"[{index:4}] {insn}")
+
+    def snapshot(self, path: str) -> None:
+        vm_snapshot.save(path, self.regs, self.memory)
+
+    def restore(self, path: str) -> None:
+        vm_snapshot.load(path, self.regs, self.memory)
 
     def step(self) -> Optional["Execution"]:
-        insn = self.insns[self.regs["PC"]]
-        self.regs["PC"] += 1
+        registers: Registers = self.registers
+        insn = self.program.insns[registers[PC]]
+        registers[PC] += 1
+        insn.execute(self.memory, registers, self.output.write)
+        return None if registers[PC] == HALT else self
+
+    def run_interp(self) -> None:
+        code: List[Insn] = self.program.insns
+        memory: Memory = self.memory
+        registers: Registers = self.registers
+        output: Output = self.output.write
+        pc: int = registers[PC]
+        while pc != HALT:
+            registers[PC] = pc + 1
+            code[pc].execute(memory, registers, output)
+            pc = registers[PC]
+
+    def run_threaded(self) -> None:
+        code: List[vm_threaded.Thunk] = self.code
+        pc: int = self.registers[PC]
+        while pc != HALT:
+            pc = code[pc](pc + 1)
+        self.registers[PC] = pc
+
+    def run_compiled(self) -> None:
+        blocks: List[vm_compile.Block] = self.blocks
+        pc: int = self.registers[PC]
+        while pc != HALT:
+            pc = blocks[pc]()
+        self.registers[PC] = pc
+
+    def block_lengths(self) -> List[int]:
+        # like Compiler.end at every PC, from the back so long blocks stay
+        # linear
+        assert self.compiler is not None
+        leaders = self.compiler.leaders
+        insns = self.program.insns
+        ends = [len(insns)] * len(insns)
+        for pc in reversed(range(len(insns) - 1)):
+            if pc + 1 in leaders or vm_compile.jumps(insns[pc]):
+                ends[pc] = pc + 1
+            else:
+                ends[pc] = ends[pc + 1]
+        self.lengths = [end - pc for pc, end in enumerate(ends)]
+        return self.lengths
+
+    def run_slice(self, steps: int) -> bool:
+        # Runs about steps instructions (the compiled engine finishes the
+        # block it is in) and returns whether the program has not halted.
+        registers: Registers = self.registers
+        pc: int = registers[PC]
+        budget = steps
         try:
-            insn.execute(self.memory, self.regs, self.labels)
-        except Exception as e:
-            if f"{e}" == "Halt":
-                return None
-            raise
-        return self
+            if self.engine == "compiled":
+                blocks: List[vm_compile.Block] = self.blocks
+                lengths: List[int] = self.lengths or self.block_lengths()
+                while pc != HALT and steps > 0:
+                    steps -= lengths[pc]
+                    pc = blocks[pc]()
+            elif self.engine == "threaded":
+                code: List[vm_threaded.Thunk] = self.code
+                while pc != HALT and steps > 0:
+                    steps -= 1
+                    pc = code[pc](pc + 1)
+            else:
+                insns: List[Insn] = self.program.insns
+                memory: Memory = self.memory
+                output: Output = self.output.write
+                while pc != HALT and steps > 0:
+                    steps -= 1
+                    registers[PC] = pc + 1
+                    insns[pc].execute(memory, registers, output)
+                    pc = registers[PC]
+        finally:
+            # a slice's output is out before the next begins
+            self.output.flush()
+        registers[PC] = pc
+        self.steps += budget - steps
+        return pc != HALT
 
-    def run(self) -> None:
-        if self.verbose:
-            print("Begin Execution")
+    def run_limited(self, limits: vm_limits.Limits) -> None:
+        # raises vm_limits.LimitExceeded if a limit trips before the
+        # program halts
+        meter = vm_limits.Meter(limits, self.memory, self.steps)
+        origin = self.program.origin
+        running = True
+        while running:
+            # reported as the instruction's index in the program as written
+            pc = self.registers[PC]
+            index = origin[pc] if 0 <= pc < len(origin) else pc
+            meter.check(index, self.steps, self.memory)
+            running = self.run_slice(meter.budget(self.steps))
+
+    def run_profiled(self) -> vm_profile.Profile:
+        # a separate instrumented loop, whatever the engine, so the others
+        # carry no profiling cost
+        try:
+            return vm_profile.profile(
+                self.program,
+                self.insns,
+                self.memory,
+                self.registers,
+                self.output.write,
+            )
+        finally:
+            self.output.flush()
+
+    def run_traced(self, tracer: vm_trace.Tracer) -> None:
+        try:
+            tracer.run(
+                self.program,
+                self.memory,
+                self.registers,
+                self.output.write,
+                self.int64,
+            )
+        finally:
+            self.output.flush()
+
+    def run_verbose(self) -> None:
+        print("Begin Execution")
+        self.dump_state()
+        while self.step() is not None:
             self.dump_state()
-        o: Optional[Execution] = self
-        while o is not None:
-            o = self.step()
+        print("End Execution")
+
+    def run(self) -> None:
+        try:
             if self.verbose:
-                self.dump_state()
-        if self.verbose:
-            print("End Execution")
+                self.run_verbose()
+            elif self.limits is not None:
+                self.run_limited(self.limits)
+            elif self.engine == "threaded":
+                self.run_threaded()
+            elif self.engine == "compiled":
+                self.run_compiled()
+            else:
+                self.run_interp()
+        finally:
+            # what was printed before a fault is written too
+            self.output.flush()
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Awaitable, Callable, Generator, List, Optional
+
+from . import vm_output
+from .vm import Execution
+
+# instructions a VM runs before the others get a turn
+default_slice = 10_000
+
+# receives each line a VM prints
+Sink = Callable[[str], Awaitable[None]]
+
+
+class Job:
+    # One VM on a Host.  Await the job (or wait()) for it to finish, which
+    # raises what the program raised; cancel() stops it at the end of its
+    # current slice.  Without a sink, printed lines collect in output.  The
+    # job gives the Execution a ListSink of its own, emptied into the sink
+    # after each slice.
+    def __init__(self, exe: Execution, sink: Optional[Sink] = None):
+        printed = vm_output.ListSink()
+        exe.redirect(printed)
+        self.exe: Execution = exe
+        self.printed: List[int] = printed.values
+        self.output: List[str] = []
+        self.sink: Sink = sink or self.collect
+        # turns taken so far
+        self.slices: int = 0
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    async def collect(self, line: str) -> None:
+        self.output.append(line)
+
+    async def drive(self, steps: int) -> None:
+        printed = self.printed
+        running = True
+        while running:
+            try:
+                running = self.exe.run_slice(steps)
+            finally:
+                # what was printed before a fault still reaches the sink
+                values = printed[:]
+                printed.clear()
+                for value in values:
+                    await self.sink(f"{value}\n")
+            self.slices += 1
+            await asyncio.sleep(0)
+
+    def cancel(self) -> bool:
+        return self.task is not None and self.task.cancel()
+
+    def done(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    async def wait(self) -> None:
+        assert self.task is not None
+        await self.task
+
+    def __await__(self) -> Generator:
+        return self.wait().__await__()
+
+
+class Host:
+    # Runs many VMs on one event loop, each for steps instructions at a time
+    # before yielding, so VMs and other coroutines share the loop.  A slice
+    # runs synchronously into its VM's own ListSink, so Print output is kept
+    # apart per VM and passed to its sink between slices.
+    def __init__(self, steps: int = default_slice):
+        if steps <= 0:
+            raise Exception(f"Slice must be positive: {steps}")
+        self.steps: int = steps
+        self.jobs: List[Job] = []
+
+    def start(self, exe: Execution, sink: Optional[Sink] = None) -> Job:
+        # must be called with the loop running
+        job = Job(exe, sink)
+        job.task = asyncio.get_running_loop().create_task(
+            job.drive(self.steps)
+        )
+        self.jobs.append(job)
+        return job
+
+    async def join(self) -> List[Optional[BaseException]]:
+        # waits for every job, returning what each raised (None if it
+        # halted), cancellations included
+        tasks = [job.task for job in self.jobs if job.task is not None]
+        return list(await asyncio.gather(*tasks, return_exceptions=True))
+
+    def cancel(self) -> None:
+        for job in self.jobs:
+            job.cancel()
@@ -0,0 +1,181 @@
+import collections
+import itertools
+import os
+from concurrent import futures
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional
+
+from . import vm_binary, vm_limits, vm_memory, vm_output, vm_stream
+from .vm import Execution
+from .vm_insns import *
+
+# argument vectors sent to a worker at a time
+default_chunk = 256
+
+
+class Result(NamedTuple):
+    # position of args in the batch
+    position: int
+    args: List[int]
+    # what the program printed
+    output: str
+    # the cell after the arguments, where programs leave their result
+    value: int
+    # "" unless the run raised
+    error: str
+
+
+def load(path: str) -> List[Insn]:
+    # a source or binary program
+    with open(path, "rb") as f:
+        data = f.read()
+    if vm_binary.is_binary(data[: len(vm_binary.magic)]):
+        return vm_binary.loads(data)
+    return list(vm_stream.parse_path(path))
+
+
+class Worker:
+    # One program, parsed and linked once, run over argument vectors laid
+    # out as vmcmd lays them out.  Memory, registers and the output list
+    # are cleared in place between runs since the threaded and compiled
+    # engines hold on to them.
+    def __init__(
+        self,
+        program: str | List[Insn],
+        engine: str = "interp",
+        memory_size: Optional[int] = None,
+        memory_kind: str = "list",
+        page_size: int = vm_memory.default_page_size,
+        int64: bool = False,
+        limits: Optional[vm_limits.Limits] = None,
+    ):
+        insns = load(program) if isinstance(program, str) else program
+        self.memory: Memory = vm_memory.allocate(
+            [], memory_size, memory_kind, page_size
+        )
+        # a clean copy to clear list and array memory from
+        self.blank: Optional[Memory] = (
+            None
+            if isinstance(self.memory, vm_memory.PagedMemory)
+            else self.memory[:]  # type: ignore
+        )
+        self.output: vm_output.ListSink = vm_output.ListSink()
+        self.exe: Execution = Execution(
+            insns,
+            self.memory,
+            {"SP": 0},
+            engine=engine,
+            int64=int64,
+            output=self.output,
+        )
+        # a run that trips a limit fails alone, keeping its worker
+        self.exe.limits = limits
+
+    def reset(self, params: List[int]) -> None:
+        memory = self.memory
+        if self.blank is None:
+            memory.pages.clear()  # type: ignore
+        else:
+            if len(params) > len(memory):
+                raise Exception(
+                    f"Memory size {len(memory)} too small for"
+                    f" {len(params)} args"
+                )
+            memory[:] = self.blank
+        for address, value in enumerate(params):
+            memory[address] = value
+        registers = self.exe.registers
+        registers[:] = [0] * len(registers)
+        self.exe.regs["SP"] = len(params)
+        self.output.values.clear()
+
+    def run(self, position: int, args: List[int]) -> Result:
+        params = list(reversed(args)) + [0]  # w/ space for return value
+        error = ""
+        try:
+            self.reset(params)
+            self.exe.run()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        value = self.memory[len(args)] if not error else 0
+        output = "".join(f"{printed}\n" for printed in self.output.values)
+        return Result(position, args, output, value, error)
+
+
+# the worker of each pool process
+worker: Optional[Worker] = None
+
+
+def start(*options) -> None:
+    global worker
+    worker = Worker(*options)
+
+
+def run_chunk(first: int, chunk: List[List[int]]) -> List[Result]:
+    assert worker is not None
+    return [worker.run(first + i, args) for i, args in enumerate(chunk)]
+
+
+def chunks(
+    vectors: Iterable[List[int]], size: int
+) -> Iterator[List[List[int]]]:
+    it = iter(vectors)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def run_batch(
+    program: str | List[Insn],
+    vectors: Iterable[List[int]],
+    jobs: Optional[int] = None,
+    ordered: bool = True,
+    chunk: int = default_chunk,
+    engine: str = "interp",
+    memory_size: Optional[int] = None,
+    memory_kind: str = "list",
+    page_size: int = vm_memory.default_page_size,
+    int64: bool = False,
+    limits: Optional[vm_limits.Limits] = None,
+) -> Iterator[Result]:
+    # Runs program, a path or instructions, once per argument vector
+    # across a pool of jobs processes, yielding results in input order or,
+    # unless ordered, as they complete.  Vectors are read lazily and only a
+    # few chunks per process are in flight at once.
+    options = (
+        program,
+        engine,
+        memory_size,
+        memory_kind,
+        page_size,
+        int64,
+        limits,
+    )
+    # set up once here, so a bad program or option raises its own error
+    # rather than breaking the pool
+    Worker(*options)
+    jobs = jobs or os.cpu_count() or 1
+    limit = 2 * jobs
+    with futures.ProcessPoolExecutor(
+        jobs, initializer=start, initargs=options
+    ) as pool:
+        pending: Deque[futures.Future[List[Result]]] = collections.deque()
+        first = 0
+        for vectors_ in chunks(vectors, chunk):
+            pending.append(pool.submit(run_chunk, first, vectors_))
+            first += len(vectors_)
+            while len(pending) >= limit:
+                yield from next_results(pending, ordered)
+        while pending:
+            yield from next_results(pending, ordered)
+
+
+def next_results(
+    pending: Deque["futures.Future[List[Result]]"], ordered: bool
+) -> List[Result]:
+    # the results of the oldest chunk or, unless ordered, of whichever
+    # finishes first
+    if ordered:
+        return pending.popleft().result()
+    done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+    found = done.pop()
+    pending.remove(found)
+    return found.result()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent import futures
+from typing import Any, Callable, Dict, List
+
+from . import vm_memory, vm_output, vm_stream
+from .scanner import Scanner
+from .vm import Execution, engines
+from .vm_insns import *
+from .vm_parser import Parser
+
+bench_dir = os.path.join(os.path.dirname(__file__), "bench")
+
+# instructions in the generated front-end stress file
+default_stress = 1_000_000
+
+# instructions between checks of the clock; large enough not to matter
+slice_steps = 1 << 20
+
+
+def programs() -> List[str]:
+    return sorted(
+        name[: -len(".vm")]
+        for name in os.listdir(bench_dir)
+        if name.endswith(".vm")
+    )
+
+
+def peak_rss() -> int:
+    # kilobytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def stress_source(size: int) -> str:
+    # Straight-line code with every operand form the scanner and parser
+    # meet: registers, negative and large integers, labels, jumps and
+    # comments.  Only parsed, never run.
+    lines: List[str] = []
+    for i in range(size):
+        a, b, c = f"r{i % 16}", f"r{i * 7 % 16}", f"r{i * 11 % 16}"
+        match i % 10:
+            case 0:
+                lines.append(f'lab "L{i}"')
+            case 1:
+                lines.append(f"imm {a} {i * 7919}")
+            case 2:
+                lines.append(f"add {a} {b} {c}")
+            case 3:
+                lines.append(f"addi {a} {b} -{i % 1000}")
+            case 4:
+                lines.append(f"mul {a} {b} {c}  // scaled")
+            case 5:
+                lines.append(f"st SP {a}")
+            case 6:
+                lines.append(f"ld {a} SP")
+            case 7:
+                lines.append(f'jz {a} "L{i - 7}"')
+            case 8:
+                lines.append(f"lt {a} {b} {c}")
+            case _:
+                lines.append(f"print {a}")
+    return "\n".join(lines) + "\n"
+
+
+def execute(path: str, engine: str, repeat: int) -> Dict[str, Any]:
+    # the best of repeat runs of one program, from a clean memory each time
+    insns = list(vm_stream.parse_path(path))
+    best: Dict[str, Any] = {}
+    for _ in range(repeat):
+        output = vm_output.ListSink()
+        start = time.perf_counter()
+        exe = Execution(
+            insns, vm_memory.allocate([0]), {"SP": 1}, engine, output=output
+        )
+        exe.run_slice(0)  # builds the compiled engine's block lengths
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        while exe.run_slice(slice_steps):
+            pass
+        seconds = time.perf_counter() - start
+        if not best or seconds < best["seconds"]:
+            best = {
+                "insns": exe.steps,
+                "setup_s": setup,
+                "seconds": seconds,
+                "insns_per_s": exe.steps / seconds,
+                "output": output.values,
+            }
+    best["peak_rss_kb"] = peak_rss()
+    return best
+
+
+def front_end(path: str, repeat: int) -> Dict[str, Any]:
+    with open(path) as f:
+        source = f.read()
+    scan = parse = float("inf")
+    tokens = insns = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = len(Scanner(source, reserved=reserved).tokens)
+        scan = min(scan, time.perf_counter() - start)
+        start = time.perf_counter()
+        insns = len(Parser(Scanner(source, reserved=reserved)).parse())
+        parse = min(parse, time.perf_counter() - start)
+    stream = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in vm_stream.parse_path(path):
+            pass
+        stream = min(stream, time.perf_counter() - start)
+    return {
+        "bytes": len(source.encode()),
+        "tokens": tokens,
+        "insns": insns,
+        "scan_s": scan,
+        "scan_mb_per_s": len(source.encode()) / scan / 1e6,
+        "tokens_per_s": tokens / scan,
+        # scanning and parsing the whole source, then streaming the file
+        "parse_s": parse,
+        "parse_insns_per_s": insns / parse,
+        "stream_s": stream,
+        "stream_insns_per_s": insns / stream,
+        "peak_rss_kb": peak_rss(),
+    }
+
+
+def startup(path: str, repeat: int) -> float:
+    # the best wall time of vmcmd running a program that halts at once
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-m", f"{__package__}.vmcmd", "--file", path]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=root, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def isolated(function: Callable[..., Any], *args: Any) -> Any:
+    # a fresh process each, so peak RSS belongs to one measurement
+    context = multiprocessing.get_context("spawn")
+    with futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(function, *args).result()
+
+
+def get_args():
+    ap = argparse.ArgumentParser(description="Benchmark the VM")
+    ap.add_argument(
+        "--program",
+        action="append",
+        choices=programs(),
+        help="benchmark to run (repeatable; default: all)",
+    )
+    ap.add_argument(
+        "--engine",
+        action="append",
+        choices=engines,
+        help="engine to run them on (repeatable; default: all)",
+    )
+    ap.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="runs of each measurement; the best is reported",
+    )
+    ap.add_argument(
+        "--stress",
+        type=int,
+        default=default_stress,
+        help="instructions in the front-end stress file (0 to skip)",
+    )
+    ap.add_argument(
+        "--json",
+        metavar="PATH",
+        help="write the results to PATH instead of stdout",
+    )
+    return ap.parse_args()
+
+
+def main():
+    args = get_args()
+    results: Dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        halt = os.path.join(directory, "halt.vm")
+        with open(halt, "w") as f:
+            f.write("halt\n")
+        results["startup_s"] = startup(halt, args.repeat)
+        if args.stress:
+            stress = os.path.join(directory, "stress.vm")
+            with open(stress, "w") as f:
+                f.write(stress_source(args.stress))
+            results["front_end"] = isolated(front_end, stress, args.repeat)
+    runs: List[Dict[str, Any]] = []
+    for name in args.program or programs():
+        path = os.path.join(bench_dir, f"{name}.vm")
+        for engine in args.engine or engines:
+            run = {"program": name, "engine": engine}
+            run.update(isolated(execute, path, engine, args.repeat))
+            print(
+                f"{name:8} {engine:9} {run['insns_per_s']:14,.0f} insns/s",
+                file=sys.stderr,
+            )
+            runs.append(run)
+    results["runs"] = runs
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+
+
+if __name__ == "__main__":
+    main()
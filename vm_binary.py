@@ -0,0 +1,159 @@
+import dataclasses
+import io
+import os
+import struct
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Tuple,
+    Type,
+)
+
+from . import vm_cache, vm_insns
+from .vm_compile import operations
+from .vm_insns import Insn, reserved
+from .vm_parser import Parser
+from .scanner import Scanner
+
+# bump when the encoding changes
+version = 1
+
+magic = b"VMPROG%02d" % version
+
+# magic, digest of the vm.json the program was encoded for, flags
+header = struct.Struct("<8s32sB")
+COMMENTS = 1
+
+# a record tag is an opcode, or STRING for a string-table entry: a u32
+# length and utf-8 bytes, referred to by later records by position
+STRING = 0xFF
+length = struct.Struct("<I")
+
+
+class Layout(NamedTuple):
+    cls: Type[Insn]
+    names: Tuple[str, ...]
+    fields: struct.Struct
+    strings: Tuple[bool, ...]
+
+
+def layouts(comments: bool) -> List[Layout]:
+    # opcodes are positions in the spec; str operands, and register and
+    # label operands (names, as programs are stored unlinked), are u32
+    # string-table indices, int operands are int64
+    result: List[Layout] = []
+    for name in operations():
+        cls = getattr(vm_insns, name)
+        fields = [
+            f
+            for f in dataclasses.fields(cls)
+            if comments or f.name != "comment"
+        ]
+        strings = tuple(f.type in (str, vm_insns.Ref) for f in fields)
+        codes = "".join("I" if string else "q" for string in strings)
+        names = tuple(f.name for f in fields)
+        fmt = struct.Struct("<" + codes)
+        result.append(Layout(cls, names, fmt, strings))
+    return result
+
+
+def spec_digest() -> bytes:
+    return bytes.fromhex(vm_cache.spec_digest())
+
+
+class Writer:
+    def __init__(self, f: BinaryIO, comments: bool = False):
+        self.f: BinaryIO = f
+        self.comments: bool = comments
+        self.layouts: List[Layout] = layouts(comments)
+        self.opcodes: Dict[type, int] = {
+            layout.cls: i for i, layout in enumerate(self.layouts)
+        }
+        self.strings: Dict[str, int] = {}
+        flags = COMMENTS if comments else 0
+        f.write(header.pack(magic, spec_digest(), flags))
+
+    def string(self, s: str) -> int:
+        if s not in self.strings:
+            data = s.encode()
+            self.f.write(bytes([STRING]) + length.pack(len(data)) + data)
+            self.strings[s] = len(self.strings)
+        return self.strings[s]
+
+    def write(self, insn: Insn) -> None:
+        opcode = self.opcodes[type(insn)]
+        layout = self.layouts[opcode]
+        values = [getattr(insn, name) for name in layout.names]
+        operands = [
+            self.string(v) if is_str else v
+            for v, is_str in zip(values, layout.strings)
+        ]
+        self.f.write(bytes([opcode]) + layout.fields.pack(*operands))
+
+
+def dump(insns: Iterable[Insn], f: BinaryIO, comments: bool = False) -> None:
+    writer = Writer(f, comments)
+    for insn in insns:
+        writer.write(insn)
+
+
+def iter_loads(data: bytes) -> Iterator[Insn]:
+    view = memoryview(data)
+    tag, digest, flags = header.unpack_from(view)
+    if tag != magic:
+        raise Exception("Not a compiled VM program")
+    if digest != spec_digest():
+        raise Exception("Compiled VM program is for a different spec")
+    table = layouts(bool(flags & COMMENTS))
+    strings: List[str] = []
+    offset = header.size
+    while offset < len(view):
+        opcode = view[offset]
+        offset += 1
+        if opcode == STRING:
+            (n,) = length.unpack_from(view, offset)
+            offset += length.size
+            strings.append(str(view[offset : offset + n], "utf-8"))
+            offset += n
+            continue
+        cls, _, fields, is_strs = table[opcode]
+        values = fields.unpack_from(view, offset)
+        offset += fields.size
+        yield cls(*[strings[v] if s else v for v, s in zip(values, is_strs)])
+
+
+def loads(data: bytes) -> List[Insn]:
+    return list(iter_loads(data))
+
+
+def is_binary(data: bytes) -> bool:
+    return data.startswith(magic[:6])
+
+
+def cached_insns(
+    source: str,
+    directory: str = vm_cache.default_dir,
+    limit: int = vm_cache.default_limit,
+) -> List[Insn]:
+    key = vm_cache.digest(source, vm_cache.spec_digest(), f"bin{version}")
+    path = os.path.join(directory, f"vm_{key[:40]}.vmb")
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mark as recently used
+        return loads(data)
+    except FileNotFoundError:
+        pass
+    insns: List[Insn] = Parser(Scanner(source, reserved=reserved)).parse()
+    buffer = io.BytesIO()
+    try:
+        dump(insns, buffer)
+    except struct.error:
+        return insns  # an operand does not fit in 64 bits; leave uncached
+    vm_cache.store(path, buffer.getvalue())
+    vm_cache.evict(directory, limit, keep=path)
+    return insns
@@ -0,0 +1,70 @@
+import hashlib
+import importlib.util
+import os
+import tempfile
+
+default_dir: str = os.environ.get(
+    "VM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "vm")
+)
+
+# size of a cache directory before the least recently used entries go
+default_limit = 256 * 1024 * 1024
+
+spec_path: str = os.path.join(os.path.dirname(__file__), "vm.json")
+
+
+def digest(*parts: str | bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode() if isinstance(part, str) else part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def spec_digest() -> str:
+    # cached artifacts are only valid for the instruction semantics they
+    # were built from
+    with open(spec_path, "rb") as f:
+        return digest(f.read())
+
+
+def store(path: str, data: bytes) -> None:
+    # write to a temporary file and rename, so concurrent runs never see a
+    # partially written entry
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def evict(directory: str, limit: int, keep: str = "") -> None:
+    # drop the least recently used entries, other than keep, until the
+    # cache fits in limit bytes; a transpiled module goes together with its
+    # compiled bytecode
+    entries = []
+    for entry in os.scandir(directory):
+        if not entry.is_file() or entry.name.endswith(".tmp"):
+            continue
+        if entry.path == keep:
+            continue
+        paths = [entry.path]
+        if entry.name.endswith(".py"):
+            paths.append(importlib.util.cache_from_source(entry.path))
+        size = sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+        entries.append((entry.stat().st_mtime, size, paths))
+    total = sum(size for _, size, _ in entries)
+    for _, size, paths in sorted(entries):
+        if total <= limit:
+            break
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        total -= size
@@ -0,0 +1,361 @@
+from dataclasses import dataclass, field
+from typing import (
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from .vm_compile import transfers
+from .vm_insns import *
+
+# A register is a name in parsed code and a register-file index in linked
+# code; a target is a label name or a PC likewise.
+Register = Hashable
+Fact = TypeVar("Fact")
+
+calls = (Call, CallIndirect)
+
+
+@dataclass
+class Block:
+    number: int
+    # instructions [start, end) of the list the graph was built from
+    start: int
+    end: int
+    succs: List[int] = field(default_factory=list)
+    preds: List[int] = field(default_factory=list)
+
+
+class CFG:
+    # Basic blocks of a parsed instruction list, or of a linked program's
+    # insns when its labels are given.
+    #
+    # Jumps, branches and calls have edges to their targets, and a call
+    # also has an edge to its return site, standing for the callee coming
+    # back.  JumpIndirect and CallIndirect may reach any address the
+    # program can make: a LoadLabel'd label or a return site.  Programs
+    # that compute addresses any other way are not modelled.
+    def __init__(
+        self, insns: List[Insn], labels: Optional[Mapping[str, int]] = None
+    ):
+        self.insns: List[Insn] = insns
+        self.linked: bool = labels is not None
+        self.labels: Dict[str, int] = (
+            dict(labels) if labels is not None else self.find_labels()
+        )
+        self.ra: Register = RA if self.linked else "RA"
+        self.specials: Set[Register] = (
+            set(range(len(special_registers)))
+            if self.linked
+            else set(special_registers)
+        )
+        self.blocks: List[Block] = []
+        # index in insns -> number of the block holding it
+        self.block_at: List[int] = []
+        self.split()
+        self.connect()
+
+    def find_labels(self) -> Dict[str, int]:
+        labels: Dict[str, int] = {}
+        for i, insn in enumerate(self.insns):
+            if isinstance(insn, Label):
+                labels.setdefault(insn.label, i)
+        return labels
+
+    def position(self, target: int | str) -> int:
+        return target if isinstance(target, int) else self.labels[target]
+
+    def split(self) -> None:
+        insns = self.insns
+        leaders: Set[int] = {0}
+        leaders.update(self.labels.values())
+        for i, insn in enumerate(insns):
+            if transfers(insn):
+                leaders.add(i + 1)
+        # a run of labels starts a single block
+        starts = sorted(
+            i
+            for i in leaders
+            if i < len(insns)
+            and (i == 0 or not isinstance(insns[i - 1], Label))
+        )
+        for number, start in enumerate(starts):
+            end = (
+                starts[number + 1] if number + 1 < len(starts) else len(insns)
+            )
+            self.blocks.append(Block(number, start, end))
+            self.block_at += [number] * (end - start)
+
+    def block_of(self, target: int | str) -> int:
+        return self.block_at[self.position(target)]
+
+    def address_taken(self) -> List[int]:
+        # blocks an indirect transfer may reach
+        found: Set[int] = set()
+        for i, insn in enumerate(self.insns):
+            if isinstance(insn, LoadLabel):
+                found.add(self.block_of(insn.label))
+            elif isinstance(insn, calls) and i + 1 < len(self.insns):
+                found.add(self.block_at[i + 1])
+        return sorted(found)
+
+    def successors(self, block: Block, indirect: List[int]) -> List[int]:
+        last = self.insns[block.end - 1]
+        following = [block.number + 1] if block.end < len(self.insns) else []
+        if not transfers(last):
+            return following
+        if isinstance(last, Jump):
+            return [self.block_of(last.label)]
+        if isinstance(last, (JumpIfZero, JumpIfNotZero)):
+            return [self.block_of(last.label)] + following
+        if isinstance(last, Call):
+            return [self.block_of(last.label)] + following
+        if isinstance(last, CallIndirect):
+            return indirect + following
+        if isinstance(last, JumpIndirect):
+            return list(indirect)
+        return []  # Halt
+
+    def connect(self) -> None:
+        indirect = self.address_taken()
+        for block in self.blocks:
+            for succ in dict.fromkeys(self.successors(block, indirect)):
+                block.succs.append(succ)
+                self.blocks[succ].preds.append(block.number)
+
+    def block_insns(self, number: int) -> List[Insn]:
+        block = self.blocks[number]
+        return self.insns[block.start : block.end]
+
+    def reads(self, insn: Insn) -> Set[Register]:
+        return {getattr(insn, name) for name in insn.uses}
+
+    def writes(self, insn: Insn) -> Set[Register]:
+        written: Set[Register] = {getattr(insn, name) for name in insn.defs}
+        if isinstance(insn, calls):
+            written.add(self.ra)
+        return written
+
+    def postorder(self) -> List[int]:
+        # blocks reachable from the entry
+        order: List[int] = []
+        if not self.blocks:
+            return order
+        seen: Set[int] = {0}
+        stack: List[Tuple[int, int]] = [(0, 0)]
+        while stack:
+            number, i = stack.pop()
+            succs = self.blocks[number].succs
+            if i < len(succs):
+                stack.append((number, i + 1))
+                if succs[i] not in seen:
+                    seen.add(succs[i])
+                    stack.append((succs[i], 0))
+            else:
+                order.append(number)
+        return order
+
+    def reachable(self) -> Set[int]:
+        return set(self.postorder())
+
+
+def dominators(cfg: CFG) -> Dict[int, int]:
+    # immediate dominator of every reachable block; the entry maps to itself
+    # (Cooper, Harvey and Kennedy's iterative algorithm)
+    if not cfg.blocks:
+        return {}
+    order = list(reversed(cfg.postorder()))
+    rank = {number: i for i, number in enumerate(order)}
+    idom: Dict[int, int] = {0: 0}
+
+    def intersect(a: int, b: int) -> int:
+        while a != b:
+            while rank[a] > rank[b]:
+                a = idom[a]
+            while rank[b] > rank[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for number in order[1:]:
+            preds = [p for p in cfg.blocks[number].preds if p in idom]
+            new = preds[0]
+            for p in preds[1:]:
+                new = intersect(p, new)
+            if idom.get(number) != new:
+                idom[number] = new
+                changed = True
+    return idom
+
+
+def dominates(idom: Mapping[int, int], a: int, b: int) -> bool:
+    while b != a:
+        if idom[b] == b:
+            return False
+        b = idom[b]
+    return True
+
+
+@dataclass
+class Loop:
+    header: int
+    blocks: Set[int]
+    parent: Optional["Loop"] = None
+    children: List["Loop"] = field(default_factory=list)
+
+    def depth(self) -> int:
+        return 1 + self.parent.depth() if self.parent else 1
+
+
+def loops(cfg: CFG, idom: Mapping[int, int]) -> List[Loop]:
+    # natural loops, one per header, outermost first
+    bodies: Dict[int, Set[int]] = {}
+    for number in idom:
+        for succ in cfg.blocks[number].succs:
+            if succ in idom and dominates(idom, succ, number):
+                body = bodies.setdefault(succ, {succ})
+                work = [number]
+                while work:
+                    n = work.pop()
+                    if n not in body:
+                        body.add(n)
+                        work += [p for p in cfg.blocks[n].preds if p in idom]
+    found = sorted(
+        (Loop(header, body) for header, body in bodies.items()),
+        key=lambda loop: -len(loop.blocks),
+    )
+    for i, loop in enumerate(found):
+        for outer in reversed(found[:i]):
+            if loop.header in outer.blocks and loop.blocks <= outer.blocks:
+                loop.parent = outer
+                outer.children.append(loop)
+                break
+    return found
+
+
+def loop_depths(cfg: CFG, found: List[Loop]) -> List[int]:
+    depth = [0] * len(cfg.blocks)
+    for loop in found:
+        for number in loop.blocks:
+            depth[number] = max(depth[number], loop.depth())
+    return depth
+
+
+class Dataflow(Generic[Fact]):
+    # Iterates transfer over the blocks until nothing changes.  Forward
+    # problems combine the facts flowing out of a block's predecessors,
+    # backward ones those flowing into its successors; boundary is the fact
+    # at the entry (or at blocks without successors) and initial the
+    # starting guess everywhere else.
+    def __init__(
+        self,
+        cfg: CFG,
+        forward: bool,
+        boundary: Fact,
+        initial: Fact,
+        meet: Callable[[List[Fact]], Fact],
+        transfer: Callable[[int, Fact], Fact],
+    ):
+        self.cfg = cfg
+        self.forward = forward
+        self.boundary = boundary
+        self.initial = initial
+        self.meet = meet
+        self.transfer = transfer
+        self.ins: Dict[int, Fact] = {}
+        self.outs: Dict[int, Fact] = {}
+
+    def solve(self) -> "Dataflow[Fact]":
+        blocks = self.cfg.blocks
+        order = list(reversed(self.cfg.postorder()))
+        if not self.forward:
+            order.reverse()
+        for number in order:
+            self.ins[number] = self.initial
+            self.outs[number] = self.initial
+        work = list(reversed(order))
+        queued = set(work)
+        while work:
+            number = work.pop()
+            queued.discard(number)
+            if self.forward:
+                sources = [p for p in blocks[number].preds if p in self.outs]
+                before = (
+                    self.boundary
+                    if number == 0
+                    else self.meet([self.outs[p] for p in sources])
+                )
+                after = self.transfer(number, before)
+                self.ins[number] = before
+                changed = after != self.outs[number]
+                self.outs[number] = after
+                dependents = blocks[number].succs
+            else:
+                sources = [s for s in blocks[number].succs if s in self.ins]
+                after = (
+                    self.meet([self.ins[s] for s in sources])
+                    if blocks[number].succs
+                    else self.boundary
+                )
+                before = self.transfer(number, after)
+                self.outs[number] = after
+                changed = before != self.ins[number]
+                self.ins[number] = before
+                dependents = blocks[number].preds
+            if changed:
+                for n in dependents:
+                    if n in self.ins and n not in queued:
+                        queued.add(n)
+                        work.append(n)
+        return self
+
+
+@dataclass
+class Liveness:
+    cfg: CFG
+    live_in: Dict[int, Set[Register]]
+    live_out: Dict[int, Set[Register]]
+
+    def live_after(self, index: int) -> Set[Register]:
+        # registers live just after insns[index]
+        cfg = self.cfg
+        block = cfg.blocks[cfg.block_at[index]]
+        live = set(self.live_out.get(block.number, cfg.specials))
+        for insn in reversed(cfg.insns[index + 1 : block.end]):
+            live -= cfg.writes(insn)
+            live |= cfg.reads(insn)
+        return live
+
+
+def liveness(cfg: CFG) -> Liveness:
+    # Registers are live at Halt only if special, since the host may read
+    # them; a call's effect on registers comes through its edges.
+    summaries: Dict[int, Tuple[Set[Register], Set[Register]]] = {}
+    for block in cfg.blocks:
+        used: Set[Register] = set()
+        defined: Set[Register] = set()
+        for insn in cfg.block_insns(block.number):
+            used |= cfg.reads(insn) - defined
+            defined |= cfg.writes(insn)
+        summaries[block.number] = (used, defined)
+
+    def transfer(number: int, live: Set[Register]) -> Set[Register]:
+        used, defined = summaries[number]
+        return used | (live - defined)
+
+    def meet(facts: List[Set[Register]]) -> Set[Register]:
+        return set().union(*facts)
+
+    flow = Dataflow(
+        cfg, False, set(cfg.specials), set(), meet, transfer
+    ).solve()
+    return Liveness(cfg, flow.ins, flow.outs)
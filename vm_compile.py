@@ -0,0 +1,169 @@
+import functools
+import os
+import re
+from typing import Callable, Dict, List, Set, Tuple, TypeAlias
+
+from . import mk_interp
+from .vm_insns import *
+from .vm_link import Program
+
+# A compiled basic block runs to its end and returns the next PC.
+Block: TypeAlias = Callable[[], int]
+
+spec_path: str = os.path.join(os.path.dirname(__file__), "vm.json")
+
+# two's-complement wrap of an arithmetic result to 64 bits
+wrap64 = (
+    "((({}) + 0x8000000000000000) & 0xFFFFFFFFFFFFFFFF) - 0x8000000000000000"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def operations() -> Dict[str, mk_interp.Operation]:
+    return {op.cls: op for op in mk_interp.load_spec(spec_path)}
+
+
+@functools.lru_cache(maxsize=None)
+def mentions(cls: str, name: str) -> bool:
+    operation = operations()[cls]
+    text = " ".join(operation.stack.after + (operation.side_effects or []))
+    return re.search(rf"\b{name}\b", text) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def arithmetic(cls: str) -> bool:
+    operation = operations()[cls]
+    return any(re.search(r"[-+*/]", e) for e in operation.stack.after)
+
+
+def transfers(insn: Insn) -> bool:
+    return mentions(type(insn).__name__, "PC")
+
+
+def names_pc(insn: Insn, fields: Tuple[str, ...]) -> bool:
+    # whether a linked register operand among fields is PC itself
+    return any(getattr(insn, field) == PC for field in fields)
+
+
+def jumps(insn: Insn) -> bool:
+    # ends a block: a transfer, or a write to PC as a destination register
+    return transfers(insn) or names_pc(insn, insn.defs)
+
+
+def leaders(program: Program) -> Set[int]:
+    starts: Set[int] = {0}
+    starts.update(program.labels.values())
+    for pc, insn in enumerate(program.insns):
+        if jumps(insn):
+            starts.add(pc + 1)
+    return {pc for pc in starts if pc < len(program.insns)}
+
+
+def local(slot: int) -> str:
+    return f"r{slot}"
+
+
+def register(slot: int) -> str:
+    # the block keeps PC in pc, whether the spec or an operand names it
+    return "pc" if slot == PC else local(slot)
+
+
+class Compiler:
+    def __init__(self, program: Program, int64: bool = False):
+        self.program: Program = program
+        self.int64: bool = int64
+        self.leaders: Set[int] = leaders(program)
+        # globals of the generated code, shared by every build
+        self.namespace: Dict[str, object] = {"HALT": HALT}
+
+    def end(self, start: int) -> int:
+        insns = self.program.insns
+        pc = start + 1
+        while (
+            pc < len(insns)
+            and pc not in self.leaders
+            and not jumps(insns[pc - 1])
+        ):
+            pc += 1
+        return pc
+
+    def statements(self, pc: int) -> List[str]:
+        insn = self.program.insns[pc]
+        operation = operations()[type(insn).__name__]
+        names: Dict[str, str] = {"PC": "pc", "RA": local(RA)}
+        for field in insn.defs + insn.uses:
+            names[field] = register(getattr(insn, field))
+        for operand in operation.operands:
+            names[operand.name] = repr(getattr(insn, operand.name))
+        wrap = self.int64 and arithmetic(operation.cls)
+        return mk_interp.translate(operation, names, wrap64 if wrap else "{}")
+
+    def instruction(self, pc: int) -> List[str]:
+        insn = self.program.insns[pc]
+        lines: List[str] = []
+        if jumps(insn) or names_pc(insn, insn.uses):
+            lines.append(f"pc = {pc + 1}")
+        return lines + self.statements(pc)
+
+    def block_body(self, start: int) -> List[str]:
+        end = self.end(start)
+        body: List[str] = []
+        for pc in range(start, end):
+            body += self.instruction(pc)
+        if not jumps(self.program.insns[end - 1]):
+            body.append(f"pc = {end}")
+        return body
+
+    def block_source(self, start: int) -> List[str]:
+        reads: Set[int] = set()
+        writes: Set[int] = set()
+        for insn in self.program.insns[start : self.end(start)]:
+            reads.update(getattr(insn, field) for field in insn.uses)
+            writes.update(getattr(insn, field) for field in insn.defs)
+            if mentions(type(insn).__name__, "RA"):
+                writes.add(RA)
+        reads.discard(PC)
+        writes.discard(PC)
+        lines = [f"def b{start}():"]
+        lines += [f"    {local(r)} = registers[{r}]" for r in sorted(reads)]
+        lines += [f"    {stmt}" for stmt in self.block_body(start)]
+        lines += [f"    registers[{r}] = {local(r)}" for r in sorted(writes)]
+        lines += ["    return pc"]
+        return lines
+
+    def build(
+        self,
+        starts: List[int],
+        memory: Memory,
+        registers: Registers,
+        output: Output,
+    ) -> List[Block]:
+        lines = ["def factory(memory, registers, output):"]
+        for start in starts:
+            lines += [f"    {line}" for line in self.block_source(start)]
+        lines.append(f"    return [{', '.join(f'b{s}' for s in starts)}]")
+        namespace = self.namespace
+        exec(compile("\n".join(lines), "<vm_compile>", "exec"), namespace)
+        factory = namespace["factory"]
+        return factory(memory, registers, output)  # type: ignore
+
+    def compile(
+        self, memory: Memory, registers: Registers, output: Output
+    ) -> List[Block]:
+        # one entry per PC: block leaders are compiled up front, any other
+        # PC (e.g. a computed JumpIndirect target) is compiled on first use
+        table: List[Block] = []
+
+        def lazy(pc: int) -> Block:
+            def enter() -> int:
+                table[pc] = self.build([pc], memory, registers, output)[0]
+                return table[pc]()
+
+            return enter
+
+        table += [lazy(pc) for pc in range(len(self.program.insns))]
+        starts = sorted(self.leaders)
+        blocks = self.build(starts, memory, registers, output)
+        for start, block in zip(starts, blocks):
+            table[start] = block
+        return table
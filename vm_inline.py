@@ -0,0 +1,187 @@
+import dataclasses
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import vm_cfg
+from .vm_compile import transfers
+from .vm_insns import *
+from .vm_peephole import writes_pc
+
+
+@dataclasses.dataclass
+class Subroutine:
+    label: str
+    # the instructions [start, end) reachable from label without returning
+    start: int
+    end: int
+    # instructions, not counting labels
+    size: int
+    # never writes RA and reads it only to return, so the call and return
+    # can go
+    leaf: bool
+
+
+class Inliner:
+    # Copies small subroutines into the sites that Call them, hottest (most
+    # deeply nested in loops) first, until budget instructions have been
+    # added, over up to rounds passes so calls in copies can be inlined
+    # too.  A subroutine is the code reachable from its label up to its
+    # JumpIndirect RA returns, and must be laid out in one piece.
+    #
+    # A leaf's returns become jumps past the copy and the Call goes, which
+    # leaves RA as the caller had it; sites where RA is read before being
+    # set again keep the call's value by loading the return label into RA
+    # instead.  The host is taken not to read RA, a code address that
+    # moves as code does.  Programs that write PC as a register are left as
+    # they are.
+    def __init__(self, max_size: int = 16, budget: int = 256, rounds: int = 3):
+        self.max_size: int = max_size
+        self.budget: int = budget
+        self.rounds: int = rounds
+        self.stats: Counter[str] = Counter()
+        # labels in use, and copies made so far to name new ones by
+        self.labels: Set[str] = set()
+        self.copies: int = 0
+        self.spent: int = 0
+
+    def run(self, insns: List[Insn]) -> List[Insn]:
+        if writes_pc(insns):
+            return insns
+        for _ in range(self.rounds):
+            before = self.stats["inlined"]
+            insns = self.round(insns)
+            if self.stats["inlined"] == before:
+                break
+        return insns
+
+    def round(self, insns: List[Insn]) -> List[Insn]:
+        cfg = vm_cfg.CFG(insns)
+        cfg.specials.discard(cfg.ra)
+        live_in = vm_cfg.liveness(cfg).live_in
+        idom = vm_cfg.dominators(cfg)
+        depth = vm_cfg.loop_depths(cfg, vm_cfg.loops(cfg, idom))
+        self.labels = set(cfg.labels)
+
+        found: Dict[str, Optional[Subroutine]] = {}
+        sites: List[Tuple[int, int, int, Subroutine]] = []
+        for i, insn in enumerate(insns):
+            if not isinstance(insn, Call):
+                continue
+            if insn.label not in found:
+                found[insn.label] = self.subroutine(cfg, insn.label)
+            sub = found[insn.label]
+            if sub is not None and sub.size <= self.max_size:
+                sites.append((-depth[cfg.block_at[i]], sub.size, i, sub))
+
+        expansions: Dict[int, List[Insn]] = {}
+        for _, _, i, sub in sorted(sites):
+            ra_live = i + 1 < len(insns) and (
+                cfg.ra in live_in.get(cfg.block_at[i + 1], {cfg.ra})
+            )
+            bare = sub.leaf and not ra_live
+            call = insns[i]
+            assert isinstance(call, Call)
+            expansion = self.expand(insns, call, sub, bare)
+            growth = sum(not isinstance(x, Label) for x in expansion) - 1
+            if self.spent + growth > self.budget:
+                self.stats["over-budget"] += 1
+                continue
+            self.spent += growth
+            expansions[i] = expansion
+            self.stats["inlined"] += 1
+            if bare:
+                self.stats["call-removed"] += 1
+
+        result: List[Insn] = []
+        for i, insn in enumerate(insns):
+            result += expansions.get(i, [insn])
+        return result
+
+    def subroutine(self, cfg: vm_cfg.CFG, label: str) -> Optional[Subroutine]:
+        if label not in cfg.labels:
+            return None
+        insns = cfg.insns
+        entry = cfg.block_of(label)
+        region: Set[int] = set()
+        size = 0
+        work = [entry]
+        while work:
+            number = work.pop()
+            if number in region:
+                continue
+            region.add(number)
+            block = cfg.blocks[number]
+            for insn in cfg.block_insns(number):
+                size += not isinstance(insn, Label)
+            if size > self.max_size:
+                return None
+            last = insns[block.end - 1]
+            if isinstance(last, JumpIndirect):
+                if last.v != "RA":
+                    return None
+                continue
+            if isinstance(last, (Call, CallIndirect)) or not transfers(last):
+                # a call returns to the next block
+                if block.end == len(insns):
+                    return None
+                work.append(number + 1)
+            else:
+                work += block.succs
+        numbers = sorted(region)
+        if numbers[0] != entry or numbers[-1] - entry + 1 != len(numbers):
+            return None
+        start = cfg.blocks[entry].start
+        end = cfg.blocks[numbers[-1]].end
+        body = insns[start:end]
+        defined = {insn.label for insn in body if isinstance(insn, Label)}
+        leaf = True
+        for insn in body:
+            if isinstance(insn, Call) and insn.label in defined:
+                return None
+            if cfg.ra in cfg.writes(insn) or (
+                cfg.ra in cfg.reads(insn)
+                and not isinstance(insn, JumpIndirect)
+            ):
+                leaf = False
+            if isinstance(insn, LoadLabel) and insn.label in defined:
+                # a copy without returns must not be called
+                leaf = False
+        return Subroutine(label, start, end, size, leaf)
+
+    def fresh(self, label: str) -> str:
+        name = f"{label}@{self.copies}"
+        while name in self.labels:
+            name += "'"
+        self.labels.add(name)
+        return name
+
+    def expand(
+        self, insns: List[Insn], call: Call, sub: Subroutine, bare: bool
+    ) -> List[Insn]:
+        # the body with its labels renamed, returning to a label after it;
+        # bare drops the call and return rather than setting RA
+        self.copies += 1
+        body = insns[sub.start : sub.end]
+        renamed = {
+            insn.label: self.fresh(insn.label)
+            for insn in body
+            if isinstance(insn, Label)
+        }
+        back = self.fresh(f"{sub.label} return")
+        copy: List[Insn] = []
+        for insn in body:
+            changes = {
+                name: renamed[getattr(insn, name)]
+                for name in insn.targets
+                if getattr(insn, name) in renamed
+            }
+            if changes:
+                insn = dataclasses.replace(insn, **changes)
+            if bare and isinstance(insn, JumpIndirect):
+                insn = Jump(back, insn.comment)
+            copy.append(insn)
+        if bare:
+            if isinstance(copy[-1], Jump) and copy[-1].label == back:
+                copy.pop()
+            return copy + [Label(back)]
+        return [LoadLabel("RA", back, call.comment)] + copy + [Label(back)]
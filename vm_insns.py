@@ -1,19 +1,45 @@
-from typing import List, Dict, NoReturn, TypeAlias
+from typing import (
+    Callable,
+    ClassVar,
+    Generic,
+    List,
+    Dict,
+    MutableSequence,
+    Tuple,
+    TypeAlias,
+    TypeVar,
+)
 from dataclasses import dataclass
 
-Registers: TypeAlias = Dict[str, int]
-Labels: TypeAlias = Dict[str, int]
-Memory: TypeAlias = List[int]
+# Register and label operands: names as parsed, register-file slots and
+# PCs once linked.  Only linked instructions execute.
+Ref = TypeVar("Ref", int, str)
 
+Registers: TypeAlias = List[int]
+Memory: TypeAlias = MutableSequence[int]
+# receives each value Print prints
+Output: TypeAlias = Callable[[int], None]
 
-def halt() -> NoReturn:
-    raise Exception("Halt")
+# Registers every program has, in register-file order.
+special_registers = ["PC", "FP", "SP", "RA"]
+PC, FP, SP, RA = range(len(special_registers))
 
+# PC value that stops execution
+HALT = -1
 
-class Insn:
-    def execute(
-        self, memory: List[int], registers: Dict[str, int], labels: Dict[str, int]
-    ) -> None:
+
+@dataclass
+class VM_Error(Exception):
+    msg: str
+
+
+@dataclass
+class Insn(Generic[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ()
+
+    def execute(self, memory: Memory, registers: Registers, output: Output) -> None:
         raise NotImplementedError(f"execute not implemented for {self.__class__}")
 
     def disasm(self, long: bool = False) -> str:
@@ -21,11 +47,16 @@ class Insn:
 
 
 @dataclass
-class Label(Insn):
-    label: str
+class Label(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Label[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         pass
 
     def disasm(self, long: bool = False) -> str:
@@ -35,10 +66,15 @@ class Label(Insn):
 
 
 @dataclass
-class Noop(Insn):
+class Noop(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ()
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Noop[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         pass
 
     def disasm(self, long: bool = False) -> str:
@@ -48,12 +84,17 @@ class Noop(Insn):
 
 
 @dataclass
-class Jump(Insn):
-    label: str
+class Jump(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        registers["PC"] = labels[self.label]
+    def execute(
+        self: "Jump[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[PC] = self.label
 
     def disasm(self, long: bool = False) -> str:
         op: str = "Jump" if long else "j"
@@ -62,14 +103,19 @@ class Jump(Insn):
 
 
 @dataclass
-class JumpIfZero(Insn):
-    v: str
-    label: str
+class JumpIfZero(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    v: Ref
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "JumpIfZero[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         if registers[self.v] == 0:
-            registers["PC"] = labels[self.label]
+            registers[PC] = self.label
 
     def disasm(self, long: bool = False) -> str:
         op: str = "JumpIfZero" if long else "jz"
@@ -78,14 +124,19 @@ class JumpIfZero(Insn):
 
 
 @dataclass
-class JumpIfNotZero(Insn):
-    v: str
-    label: str
+class JumpIfNotZero(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    v: Ref
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "JumpIfNotZero[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         if registers[self.v] != 0:
-            registers["PC"] = labels[self.label]
+            registers[PC] = self.label
 
     def disasm(self, long: bool = False) -> str:
         op: str = "JumpIfNotZero" if long else "jnz"
@@ -94,12 +145,17 @@ class JumpIfNotZero(Insn):
 
 
 @dataclass
-class JumpIndirect(Insn):
-    v: str
+class JumpIndirect(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        registers["PC"] = registers[self.v]
+    def execute(
+        self: "JumpIndirect[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[PC] = registers[self.v]
 
     def disasm(self, long: bool = False) -> str:
         op: str = "JumpIndirect" if long else "ji"
@@ -108,12 +164,17 @@ class JumpIndirect(Insn):
 
 
 @dataclass
-class Immediate(Insn):
-    dst: str
+class Immediate(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
     value: int
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Immediate[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = self.value
 
     def disasm(self, long: bool = False) -> str:
@@ -123,13 +184,18 @@ class Immediate(Insn):
 
 
 @dataclass
-class LoadLabel(Insn):
-    dst: str
-    label: str
+class LoadLabel(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    dst: Ref
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        registers[self.dst] = labels[self.label]
+    def execute(
+        self: "LoadLabel[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[self.dst] = self.label
 
     def disasm(self, long: bool = False) -> str:
         op: str = "LoadLabel" if long else "llabel"
@@ -138,12 +204,17 @@ class LoadLabel(Insn):
 
 
 @dataclass
-class Move(Insn):
-    dst: str
-    x: str
+class Move(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Move[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x]
 
     def disasm(self, long: bool = False) -> str:
@@ -153,13 +224,18 @@ class Move(Insn):
 
 
 @dataclass
-class Add(Insn):
-    dst: str
-    x: str
-    y: str
+class Add(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Add[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x] + registers[self.y]
 
     def disasm(self, long: bool = False) -> str:
@@ -169,13 +245,18 @@ class Add(Insn):
 
 
 @dataclass
-class AddImmediate(Insn):
-    dst: str
-    x: str
+class AddImmediate(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
     value: int
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "AddImmediate[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x] + self.value
 
     def disasm(self, long: bool = False) -> str:
@@ -185,13 +266,18 @@ class AddImmediate(Insn):
 
 
 @dataclass
-class Sub(Insn):
-    dst: str
-    x: str
-    y: str
+class Sub(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Sub[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x] - registers[self.y]
 
     def disasm(self, long: bool = False) -> str:
@@ -201,13 +287,18 @@ class Sub(Insn):
 
 
 @dataclass
-class Mul(Insn):
-    dst: str
-    x: str
-    y: str
+class Mul(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Mul[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x] * registers[self.y]
 
     def disasm(self, long: bool = False) -> str:
@@ -217,13 +308,18 @@ class Mul(Insn):
 
 
 @dataclass
-class Div(Insn):
-    dst: str
-    x: str
-    y: str
+class Div(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Div[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = registers[self.x] // registers[self.y]
 
     def disasm(self, long: bool = False) -> str:
@@ -233,12 +329,17 @@ class Div(Insn):
 
 
 @dataclass
-class Negate(Insn):
-    dst: str
-    v: str
+class Negate(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Negate[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = -registers[self.v]
 
     def disasm(self, long: bool = False) -> str:
@@ -248,13 +349,18 @@ class Negate(Insn):
 
 
 @dataclass
-class LessThan(Insn):
-    dst: str
-    x: str
-    y: str
+class LessThan(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "LessThan[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = int(registers[self.x] < registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -264,13 +370,18 @@ class LessThan(Insn):
 
 
 @dataclass
-class GreaterThan(Insn):
-    dst: str
-    x: str
-    y: str
+class GreaterThan(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "GreaterThan[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = int(registers[self.x] > registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -280,13 +391,18 @@ class GreaterThan(Insn):
 
 
 @dataclass
-class LessThanEqual(Insn):
-    dst: str
-    x: str
-    y: str
+class LessThanEqual(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "LessThanEqual[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = int(registers[self.x] <= registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -296,13 +412,21 @@ class LessThanEqual(Insn):
 
 
 @dataclass
-class GreaterThanEqual(Insn):
-    dst: str
-    x: str
-    y: str
+class GreaterThanEqual(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "GreaterThanEqual[int]",
+        memory: Memory,
+        registers: Registers,
+        output: Output,
+    ) -> None:
         registers[self.dst] = int(registers[self.x] >= registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -312,13 +436,18 @@ class GreaterThanEqual(Insn):
 
 
 @dataclass
-class Equal(Insn):
-    dst: str
-    x: str
-    y: str
+class Equal(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Equal[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = int(registers[self.x] == registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -328,13 +457,18 @@ class Equal(Insn):
 
 
 @dataclass
-class NotEqual(Insn):
-    dst: str
-    x: str
-    y: str
+class NotEqual(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("x", "y")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    x: Ref
+    y: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "NotEqual[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = int(registers[self.x] != registers[self.y])
 
     def disasm(self, long: bool = False) -> str:
@@ -344,12 +478,17 @@ class NotEqual(Insn):
 
 
 @dataclass
-class Not(Insn):
-    dst: str
-    v: str
+class Not(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Not[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = 1 - registers[self.v]
 
     def disasm(self, long: bool = False) -> str:
@@ -359,12 +498,17 @@ class Not(Insn):
 
 
 @dataclass
-class Load(Insn):
-    dst: str
-    address: str
+class Load(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ("dst",)
+    uses: ClassVar[Tuple[str, ...]] = ("address",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    dst: Ref
+    address: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Load[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         registers[self.dst] = memory[registers[self.address]]
 
     def disasm(self, long: bool = False) -> str:
@@ -374,12 +518,17 @@ class Load(Insn):
 
 
 @dataclass
-class Store(Insn):
-    address: str
-    v: str
+class Store(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("address", "v")
+    targets: ClassVar[Tuple[str, ...]] = ()
+    address: Ref
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
+    def execute(
+        self: "Store[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
         memory[registers[self.address]] = registers[self.v]
 
     def disasm(self, long: bool = False) -> str:
@@ -389,12 +538,17 @@ class Store(Insn):
 
 
 @dataclass
-class Print(Insn):
-    v: str
+class Print(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        print(registers[self.v])
+    def execute(
+        self: "Print[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        output(registers[self.v])
 
     def disasm(self, long: bool = False) -> str:
         op: str = "Print" if long else "print"
@@ -403,13 +557,18 @@ class Print(Insn):
 
 
 @dataclass
-class CallIndirect(Insn):
-    v: str
+class CallIndirect(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ("v",)
+    targets: ClassVar[Tuple[str, ...]] = ()
+    v: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        registers["RA"] = registers["PC"]
-        registers["PC"] = registers[self.v]
+    def execute(
+        self: "CallIndirect[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[RA] = registers[PC]
+        registers[PC] = registers[self.v]
 
     def disasm(self, long: bool = False) -> str:
         op: str = "CallIndirect" if long else "calli"
@@ -418,13 +577,18 @@ class CallIndirect(Insn):
 
 
 @dataclass
-class Call(Insn):
-    label: str
+class Call(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ("label",)
+    label: Ref
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        registers["RA"] = registers["PC"]
-        registers["PC"] = labels[self.label]
+    def execute(
+        self: "Call[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[RA] = registers[PC]
+        registers[PC] = self.label
 
     def disasm(self, long: bool = False) -> str:
         op: str = "Call" if long else "call"
@@ -433,11 +597,16 @@ class Call(Insn):
 
 
 @dataclass
-class Halt(Insn):
+class Halt(Insn[Ref]):
+    defs: ClassVar[Tuple[str, ...]] = ()
+    uses: ClassVar[Tuple[str, ...]] = ()
+    targets: ClassVar[Tuple[str, ...]] = ()
     comment: str = ""
 
-    def execute(self, memory: Memory, registers: Registers, labels: Labels) -> None:
-        halt()
+    def execute(
+        self: "Halt[int]", memory: Memory, registers: Registers, output: Output
+    ) -> None:
+        registers[PC] = HALT
 
     def disasm(self, long: bool = False) -> str:
         op: str = "Halt" if long else "halt"
@@ -0,0 +1,232 @@
+import bisect
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+
+from . import vm_link
+from .vm_batch import Result
+from .vm_compile import leaders, operations, transfers
+from .vm_insns import *
+
+if TYPE_CHECKING:
+    import numpy as np
+else:
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+# memory cells per lane unless a size is given
+default_size = 1 << 12
+
+# argument vectors run together unless a width is given
+default_width = 1024
+
+# Lanes is a run of the selected lanes; every lane when they all agree
+Lanes = Any
+
+divide_by_zero = "ZeroDivisionError: integer division or modulo by zero"
+out_of_range = "IndexError: list index out of range"
+
+
+class Lockstep:
+    # Runs one program over many argument vectors at once, each register
+    # and memory cell a NumPy vector with a lane per vector.  Every lane
+    # has its own PC; the lanes at the lowest PC run its block together
+    # while the rest wait, so lanes that part at a branch meet again where
+    # the paths join.  Arithmetic wraps to 64 bits, as with --int64, and a
+    # lane that raises stops with its error while the others go on.
+    def __init__(
+        self,
+        insns: List[Insn],
+        vectors: Sequence[List[int]],
+        memory_size: int = default_size,
+    ):
+        if np is None:
+            raise Exception("The lanes engine needs NumPy")
+        self.vectors: Sequence[List[int]] = vectors
+        self.width: int = len(vectors)
+        self.program: vm_link.Program = vm_link.link(insns)
+        code = self.program.insns
+        starts = sorted(leaders(self.program))
+        bounds = starts + [len(code)]
+        # pc -> end of its block
+        self.ends: List[int] = [
+            bounds[bisect.bisect_right(starts, pc)] for pc in range(len(code))
+        ]
+        n = self.width
+        self.ids = np.arange(n)
+        self.registers = np.zeros((len(self.program.slots), n), np.int64)
+        self.memory = np.zeros((memory_size, n), np.int64)
+        for lane, args in enumerate(vectors):
+            params = list(reversed(args)) + [0]  # w/ space for return value
+            if len(params) > memory_size:
+                raise Exception(
+                    f"Memory size {memory_size} too small for"
+                    f" {len(params)} args"
+                )
+            self.memory[: len(params), lane] = params
+            self.registers[SP, lane] = len(params)
+        self.pcs = np.zeros(n, np.int64)
+        self.outputs: List[List[str]] = [[] for _ in range(n)]
+        self.errors: List[str] = [""] * n
+        # built last: the steps hold on to the arrays above
+        self.steps: List[Callable[[int, Lanes], Lanes]] = [
+            self.step(insn) for insn in code
+        ]
+
+    def fault(self, lanes: Lanes, failed: Any, error: str) -> Lanes:
+        # stops the lanes where failed holds; returns the rest
+        ids = self.ids[lanes]
+        for lane in ids[failed]:
+            self.errors[lane] = error
+        self.pcs[ids[failed]] = HALT
+        return ids[~failed]
+
+    def addresses(self, slot: int, lanes: Lanes) -> Any:
+        # addresses in register slot, wrapping negatives as lists do
+        address = self.registers[slot, lanes]
+        size = len(self.memory)
+        return address, (address < -size) | (address >= size)
+
+    def step(self, insn: Insn) -> Callable[[int, Lanes], Lanes]:
+        # a function running insn on the given lanes and returning those
+        # still running it
+        R = self.registers
+        M = self.memory
+        name = type(insn).__name__
+        if isinstance(insn, Load):
+
+            def load(pc: int, lanes: Lanes) -> Lanes:
+                address, bad = self.addresses(insn.address, lanes)
+                if bad.any():
+                    lanes = self.fault(lanes, bad, out_of_range)
+                    address = address[~bad]
+                R[insn.dst, lanes] = M[address, self.ids[lanes]]
+                return lanes
+
+            return load
+        if isinstance(insn, Store):
+
+            def store(pc: int, lanes: Lanes) -> Lanes:
+                address, bad = self.addresses(insn.address, lanes)
+                if bad.any():
+                    lanes = self.fault(lanes, bad, out_of_range)
+                    address = address[~bad]
+                M[address, self.ids[lanes]] = R[insn.v, lanes]
+                return lanes
+
+            return store
+        if isinstance(insn, Print):
+
+            def write(pc: int, lanes: Lanes) -> Lanes:
+                for lane, value in zip(self.ids[lanes], R[insn.v, lanes]):
+                    self.outputs[lane].append(f"{value}\n")
+                return lanes
+
+            return write
+        if transfers(insn):
+            return self.transfer(insn)
+        if not insn.defs:
+            return lambda pc, lanes: lanes
+        # the rest compute dst with the spec's expression
+        operation = operations()[name]
+        code = compile(operation.stack.after[0], name, "eval")
+        constants: Dict[str, Any] = {"int": lambda a: a.astype(np.int64)}
+        for operand in operation.operands:
+            constants[operand.name] = getattr(insn, operand.name)
+        uses = [(name, getattr(insn, name)) for name in operation.stack.before]
+        dst: int = getattr(insn, insn.defs[0])
+        divisor: Optional[int] = insn.y if isinstance(insn, Div) else None
+
+        def compute(pc: int, lanes: Lanes) -> Lanes:
+            if divisor is not None:
+                zero = R[divisor, lanes] == 0
+                if zero.any():
+                    lanes = self.fault(lanes, zero, divide_by_zero)
+            names = dict(constants)
+            for name, slot in uses:
+                names[name] = R[slot, lanes]
+            R[dst, lanes] = eval(code, {}, names)
+            return lanes
+
+        return compute
+
+    def transfer(self, insn: Insn) -> Callable[[int, Lanes], Lanes]:
+        R = self.registers
+        pcs = self.pcs
+        if isinstance(insn, (Jump, Halt)):
+            target = HALT if isinstance(insn, Halt) else insn.label
+
+            def jump(pc: int, lanes: Lanes) -> Lanes:
+                pcs[lanes] = target
+                return lanes
+
+            return jump
+        if isinstance(insn, (JumpIfZero, JumpIfNotZero)):
+            on_zero = isinstance(insn, JumpIfZero)
+
+            def branch(pc: int, lanes: Lanes) -> Lanes:
+                taken = (R[insn.v, lanes] == 0) == on_zero
+                pcs[lanes] = np.where(taken, insn.label, pc + 1)
+                return lanes
+
+            return branch
+        if isinstance(insn, (JumpIndirect, CallIndirect)):
+            calls = isinstance(insn, CallIndirect)
+
+            def indirect(pc: int, lanes: Lanes) -> Lanes:
+                target = R[insn.v, lanes].copy()
+                if calls:
+                    R[RA, lanes] = pc + 1
+                pcs[lanes] = target
+                return lanes
+
+            return indirect
+        if isinstance(insn, Call):
+
+            def call(pc: int, lanes: Lanes) -> Lanes:
+                R[RA, lanes] = pc + 1
+                pcs[lanes] = insn.label
+                return lanes
+
+            return call
+        raise Exception(f"Cannot run {type(insn).__name__} in lanes")
+
+    def run(self) -> List[Result]:
+        pcs = self.pcs
+        size = len(self.steps)
+        everyone = slice(None)
+        while True:
+            running = pcs != HALT
+            if not running.any():
+                break
+            invalid = running & ((pcs < 0) | (pcs >= size))
+            if invalid.any():
+                self.fault(everyone, invalid, out_of_range)
+                continue
+            pc = int(pcs[running].min())
+            at = pcs == pc
+            lanes: Lanes = everyone if at.all() else np.flatnonzero(at)
+            end = self.ends[pc]
+            for i in range(pc, end):
+                lanes = self.steps[i](i, lanes)
+            if not transfers(self.program.insns[end - 1]):
+                pcs[lanes] = end
+        self.registers[PC] = HALT
+        return self.results()
+
+    def results(self) -> List[Result]:
+        found: List[Result] = []
+        for lane, args in enumerate(self.vectors):
+            error = self.errors[lane]
+            value = 0 if error else int(self.memory[len(args), lane])
+            output = "".join(self.outputs[lane])
+            found.append(Result(lane, args, output, value, error))
+        return found
+
+
+def run_lanes(
+    insns: List[Insn],
+    vectors: Sequence[List[int]],
+    memory_size: Optional[int] = None,
+) -> List[Result]:
+    return Lockstep(insns, vectors, memory_size or default_size).run()
@@ -0,0 +1,101 @@
+import dataclasses
+import time
+from typing import Optional
+
+from .vm_insns import *
+from .vm_memory import PagedMemory
+
+# instructions run between checks unless an interval is given
+default_interval = 10_000
+
+
+@dataclasses.dataclass
+class LimitExceeded(VM_Error):
+    # which limit: "steps", "seconds" or "cells"
+    limit: str
+    # index of the next instruction in the program as written
+    pc: int
+    # counters when it tripped
+    steps: int
+    seconds: float
+    cells: int
+
+    def __str__(self) -> str:
+        return self.msg
+
+
+@dataclasses.dataclass
+class Limits:
+    # instructions to run, wall-clock seconds to run for and memory cells
+    # to hold; None for no limit
+    steps: Optional[int] = None
+    seconds: Optional[float] = None
+    cells: Optional[int] = None
+    # instructions between checks of the clock and memory
+    interval: int = default_interval
+
+
+def cells(memory: Memory) -> int:
+    # cells allocated: whole pages for paged memory
+    if isinstance(memory, PagedMemory):
+        return len(memory.pages) * memory.page_size
+    return len(memory)
+
+
+class Meter:
+    # Counts one run against its limits.  The run goes in slices of at most
+    # interval instructions (the compiled engine finishes the block it is
+    # in), and the limits are checked between them, so the checks cost
+    # nothing inside blocks and loops.
+    def __init__(self, limits: Limits, memory: Memory, steps: int = 0):
+        if limits.interval <= 0:
+            raise Exception(f"Interval must be positive: {limits.interval}")
+        # only paged memory grows; any other holds all its cells from the
+        # start, so a lower limit could never be met
+        if (
+            limits.cells is not None
+            and not isinstance(memory, PagedMemory)
+            and limits.cells < len(memory)
+        ):
+            raise Exception(
+                f"Memory limit of {limits.cells} cells is below the"
+                f" {len(memory)} cells fixed-size memory holds; use paged"
+                " memory to limit cells"
+            )
+        self.limits: Limits = limits
+        # the step counter when the run began
+        self.first: int = steps
+        self.started: float = time.monotonic()
+
+    def budget(self, steps: int) -> int:
+        # instructions for the next slice, none once the fuel is gone
+        limit = self.limits.steps
+        if limit is None:
+            return self.limits.interval
+        return max(0, min(self.limits.interval, limit - (steps - self.first)))
+
+    def check(self, pc: int, steps: int, memory: Memory) -> None:
+        limits = self.limits
+        steps -= self.first
+        seconds = time.monotonic() - self.started
+        used = cells(memory)
+        tripped = msg = ""
+        if limits.steps is not None and steps >= limits.steps:
+            tripped = "steps"
+            msg = f"Instruction limit of {limits.steps} reached"
+        elif limits.seconds is not None and seconds >= limits.seconds:
+            tripped = "seconds"
+            msg = f"Deadline of {limits.seconds}s passed"
+        elif limits.cells is not None and used > limits.cells:
+            tripped = "cells"
+            msg = f"Memory limit of {limits.cells} cells exceeded"
+        if tripped:
+            raise LimitExceeded(
+                f"{msg} at PC {pc} after {steps} steps, {seconds:.3f}s and"
+                f" {used} cells",
+                tripped,
+                pc,
+                steps,
+                seconds,
+                used,
+            )
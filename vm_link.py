@@ -0,0 +1,53 @@
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping
+
+from .vm_insns import Insn, Label, Noop
+from . import vm_regs
+
+
+@dataclass
+class Program:
+    # the executed stream: no Label/Noop, operands resolved to indices
+    insns: List[Insn]
+    # label name -> index in insns
+    labels: Dict[str, int]
+    # index in insns -> index in the original instruction list
+    origin: List[int]
+    # register name -> register-file index
+    slots: Dict[str, int]
+
+    def pcs(self) -> Dict[int, int]:
+        return {index: pc for pc, index in enumerate(self.origin)}
+
+
+def resolve(
+    insn: Insn, slots: Mapping[str, int], labels: Mapping[str, int]
+) -> Insn:
+    changes: Dict[str, int] = {}
+    for field in insn.defs + insn.uses:
+        changes[field] = slots[getattr(insn, field)]
+    for field in insn.targets:
+        label: str = getattr(insn, field)
+        if label not in labels:
+            raise Exception(f"Undefined label: {label}")
+        changes[field] = labels[label]
+    return dataclasses.replace(insn, **changes) if changes else insn
+
+
+def link(insns: Iterable[Insn], registers: Iterable[str] = ()) -> Program:
+    # a single pass, so insns may be a stream straight from the parser
+    labels: Dict[str, int] = {}
+    origin: List[int] = []
+    kept: List[Insn] = []
+    for i, insn in enumerate(insns):
+        if isinstance(insn, Label):
+            if insn.label in labels:
+                raise Exception(f"Duplicate label: {insn.label}")
+            labels[insn.label] = len(origin)
+        elif not isinstance(insn, Noop):
+            origin.append(i)
+            kept.append(insn)
+    slots = vm_regs.number_registers(kept, registers)
+    code = [resolve(insn, slots, labels) for insn in kept]
+    return Program(code, labels, origin, slots)
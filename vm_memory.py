@@ -0,0 +1,105 @@
+from array import array
+from typing import Dict, Iterator, List, MutableSequence, Optional, overload
+
+from .vm_insns import Memory, VM_Error
+
+kinds = ["list", "array", "paged"]
+
+# cells allocated beyond the arguments unless a size is given
+default_size = 100000
+
+default_page_size = 4096
+
+# a page of cells; restored snapshots map pages straight from the file
+Page = MutableSequence[int] | memoryview
+
+
+class MemoryLimitError(VM_Error):
+    pass
+
+
+class PagedMemory(MutableSequence[int]):
+    # Fixed-size pages are allocated on first write; untouched pages read
+    # as zero.  max_pages caps how many pages one VM may allocate.
+    def __init__(
+        self,
+        page_size: int = default_page_size,
+        max_pages: Optional[int] = None,
+    ):
+        if page_size <= 0 or page_size & (page_size - 1):
+            raise Exception(f"Page size must be a power of two: {page_size}")
+        self.page_size: int = page_size
+        self.shift: int = page_size.bit_length() - 1
+        self.mask: int = page_size - 1
+        self.max_pages: Optional[int] = max_pages
+        self.pages: Dict[int, Page] = {}
+
+    def allocate(self, number: int) -> Page:
+        if number < 0:
+            raise IndexError(f"Negative address: {number << self.shift}")
+        if self.max_pages is not None and len(self.pages) >= self.max_pages:
+            raise MemoryLimitError(
+                f"Memory limit of {self.max_pages} pages exceeded"
+            )
+        page = self.pages[number] = [0] * self.page_size
+        return page
+
+    @overload
+    def __getitem__(self, address: int) -> int: ...
+
+    @overload
+    def __getitem__(self, address: slice) -> List[int]: ...
+
+    def __getitem__(self, address: int | slice) -> int | List[int]:
+        if isinstance(address, slice):
+            start, stop, step = address.start, address.stop, address.step
+            return [self[i] for i in range(start or 0, stop, step or 1)]
+        page = self.pages.get(address >> self.shift)
+        return 0 if page is None else page[address & self.mask]
+
+    def __setitem__(self, address: int, value: int) -> None:  # type: ignore
+        page = self.pages.get(address >> self.shift)
+        if page is None:
+            page = self.allocate(address >> self.shift)
+        page[address & self.mask] = value
+
+    def __delitem__(self, address: int | slice) -> None:
+        raise TypeError("Cannot delete VM memory")
+
+    def insert(self, address: int, value: int) -> None:
+        raise TypeError("Cannot insert into VM memory")
+
+    def __len__(self) -> int:
+        # the extent of the allocated pages
+        return (max(self.pages, default=-1) + 1) * self.page_size
+
+    def __iter__(self) -> Iterator[int]:
+        return (self[i] for i in range(len(self)))
+
+
+def allocate(
+    params: List[int],
+    size: Optional[int] = None,
+    kind: str = "list",
+    page_size: int = default_page_size,
+) -> Memory:
+    if kind == "paged":
+        # size caps the pages that may be allocated; unlimited by default
+        max_pages = None if size is None else -(-size // page_size)
+        memory = PagedMemory(page_size, max_pages)
+        for address, value in enumerate(params):
+            memory[address] = value
+        return memory
+    if size is None:
+        size = len(params) + default_size
+    if size < len(params):
+        raise Exception(f"Memory size {size} too small for {len(params)} args")
+    if kind == "list":
+        return params + [0] * (size - len(params))
+    if kind == "array":
+        # 8 bytes per cell instead of a pointer to a boxed int, and a
+        # contiguous buffer that memoryview/NumPy can share without copying
+        memory = array("q", bytes(8 * size))
+        memory[: len(params)] = array("q", params)
+        return memory
+    raise Exception(f"Unknown memory kind: {kind}")
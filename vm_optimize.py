@@ -0,0 +1,316 @@
+import contextlib
+import io
+from collections import Counter
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from . import vm_cfg
+from .vm import Execution
+from .vm_compile import operations
+from .vm_insns import *
+from .vm_peephole import branches, pure, writes_pc
+
+
+class Address(NamedTuple):
+    # the value LoadLabel gives a register, known only after linking
+    label: str
+
+
+Value = int | Address
+Constants = Dict[vm_cfg.Register, Value]
+
+# computed from their operands by the spec's expression; Div is folded only
+# when it cannot raise
+foldable = tuple(c for c in pure if c not in (Immediate, LoadLabel, Move)) + (
+    Div,
+)
+
+# folded results are kept to what int64 mode would compute
+int64_range = range(-(1 << 63), 1 << 63)
+
+
+def evaluate(insn: Insn, env: Constants) -> Optional[int]:
+    operation = operations()[type(insn).__name__]
+    names: Dict[str, object] = {}
+    for name in operation.stack.before:
+        value = env.get(getattr(insn, name))
+        if not isinstance(value, int):
+            return None
+        names[name] = value
+    for operand in operation.operands:
+        names[operand.name] = getattr(insn, operand.name)
+    if isinstance(insn, Div) and names["y"] == 0:
+        return None
+    result = eval(operation.stack.after[0], {}, names)
+    return result if result in int64_range else None
+
+
+def rewrite(insn: Insn, env: Constants) -> Tuple[Optional[Insn], str]:
+    # insn simplified by what is known on entry to it (None if it can go),
+    # and the kind of rewrite, if any
+    if isinstance(insn, foldable):
+        value = evaluate(insn, env)
+        if value is not None:
+            return Immediate(insn.dst, value, insn.comment), "fold"
+    if isinstance(insn, Move) and insn.x in env:
+        known = env[insn.x]
+        if isinstance(known, Address):
+            return LoadLabel(insn.dst, known.label, insn.comment), "constant"
+        return Immediate(insn.dst, known, insn.comment), "constant"
+    if isinstance(insn, Add):
+        for x, y in ((insn.x, insn.y), (insn.y, insn.x)):
+            value = env.get(y)
+            if isinstance(value, int):
+                return (
+                    AddImmediate(insn.dst, x, value, insn.comment),
+                    "immediate",
+                )
+    if isinstance(insn, Sub):
+        value = env.get(insn.y)
+        if isinstance(value, int):
+            return (
+                AddImmediate(insn.dst, insn.x, -value, insn.comment),
+                "immediate",
+            )
+    if isinstance(insn, branches):
+        value = env.get(insn.v)
+        if isinstance(value, int):
+            if (value == 0) == isinstance(insn, JumpIfZero):
+                return Jump(insn.label, insn.comment), "branch"
+            return None, "branch"
+    if isinstance(insn, (JumpIndirect, CallIndirect)):
+        value = env.get(insn.v)
+        if isinstance(value, Address):
+            direct = Jump if isinstance(insn, JumpIndirect) else Call
+            return direct(value.label, insn.comment), "indirect"
+    return insn, ""
+
+
+def learn(cfg: vm_cfg.CFG, insn: Insn, env: Constants) -> None:
+    known: Optional[Value] = None
+    if isinstance(insn, Immediate):
+        known = insn.value
+    elif isinstance(insn, LoadLabel):
+        known = Address(insn.label)
+    elif isinstance(insn, Move):
+        known = env.get(insn.x)
+    for register in cfg.writes(insn):
+        env.pop(register, None)
+    if isinstance(insn, (Immediate, LoadLabel, Move)) and known is not None:
+        env[insn.dst] = known
+
+
+def meet(facts: List[Optional[Constants]]) -> Optional[Constants]:
+    # None stands for a block no path has reached yet
+    found = [fact for fact in facts if fact is not None]
+    if not found:
+        return None
+    first, rest = found[0], found[1:]
+    return {
+        register: value
+        for register, value in first.items()
+        if all(register in fact and fact[register] == value for fact in rest)
+    }
+
+
+def constants(cfg: vm_cfg.CFG) -> vm_cfg.Dataflow[Optional[Constants]]:
+    # Registers known to hold the same constant on every path to each
+    # block.  Only registers some block reads before writing are carried
+    # between blocks; no other block can see the rest.
+    crossing: Set[vm_cfg.Register] = set()
+    for block in cfg.blocks:
+        written: Set[vm_cfg.Register] = set()
+        for insn in cfg.block_insns(block.number):
+            crossing |= cfg.reads(insn) - written
+            written |= cfg.writes(insn)
+
+    def transfer(number: int, env: Optional[Constants]) -> Optional[Constants]:
+        if env is None:
+            return None
+        env = dict(env)
+        for insn in cfg.block_insns(number):
+            insn, _ = rewrite(insn, env)
+            if insn is not None:
+                learn(cfg, insn, env)
+        return {r: value for r, value in env.items() if r in crossing}
+
+    return vm_cfg.Dataflow(cfg, True, {}, None, meet, transfer).solve()
+
+
+class Optimizer:
+    # Global constant propagation and folding, indirect transfers to known
+    # labels made direct, and unreachable code and dead writes removed,
+    # counting every rewrite in stats.  As with the peephole pass, programs
+    # must only jump indirectly to label values and return addresses, and
+    # programs that write PC as a register are left as they are.
+    def __init__(self, max_passes: int = 10):
+        self.max_passes: int = max_passes
+        self.stats: Counter[str] = Counter()
+
+    def run(self, insns: List[Insn]) -> List[Insn]:
+        if writes_pc(insns):
+            return insns
+        for _ in range(self.max_passes):
+            before = sum(self.stats.values())
+            insns = self.propagate(insns)
+            insns = self.unreachable(insns)
+            insns = self.dead(insns)
+            if sum(self.stats.values()) == before:
+                break
+        return insns
+
+    def propagate(self, insns: List[Insn]) -> List[Insn]:
+        cfg = vm_cfg.CFG(insns)
+        flow = constants(cfg)
+        result: List[Insn] = []
+        for block in cfg.blocks:
+            env = flow.ins.get(block.number)
+            for insn in cfg.block_insns(block.number):
+                new: Optional[Insn] = insn
+                if env is not None:
+                    new, kind = rewrite(insn, env)
+                    if kind:
+                        self.stats[kind] += 1
+                    if new is not None:
+                        learn(cfg, new, env)
+                if new is not None:
+                    result.append(new)
+        return result
+
+    def unreachable(self, insns: List[Insn]) -> List[Insn]:
+        # labels are kept while anything still refers to them
+        cfg = vm_cfg.CFG(insns)
+        reachable = cfg.reachable()
+        kept: List[Insn] = []
+        for block in cfg.blocks:
+            if block.number in reachable:
+                kept += cfg.block_insns(block.number)
+            else:
+                for insn in cfg.block_insns(block.number):
+                    if isinstance(insn, Label):
+                        kept.append(insn)
+                    else:
+                        self.stats["unreachable"] += 1
+        referenced = {
+            getattr(insn, name)
+            for insn in kept
+            if not isinstance(insn, Label)
+            for name in insn.targets
+        }
+        return [
+            insn
+            for insn in kept
+            if not isinstance(insn, Label)
+            or insn.label in referenced
+            or cfg.block_of(insn.label) in reachable
+        ]
+
+    def dead(self, insns: List[Insn]) -> List[Insn]:
+        # Writes nothing with an effect depends on.  A pure instruction's
+        # operands are only live if its result is, so a whole unused chain
+        # of them goes in one pass.  Only registers such writes go to are
+        # followed.
+        cfg = vm_cfg.CFG(insns)
+        tracked: Set[vm_cfg.Register] = {
+            insn.dst for insn in insns if isinstance(insn, pure)
+        }
+
+        def sweep(
+            number: int, live: Set[vm_cfg.Register], kept: List[Insn]
+        ) -> Set[vm_cfg.Register]:
+            live = set(live)
+            for insn in reversed(cfg.block_insns(number)):
+                if isinstance(insn, pure) and insn.dst not in live:
+                    continue
+                live -= cfg.writes(insn)
+                live |= cfg.reads(insn) & tracked
+                kept.append(insn)
+            return live
+
+        def union(facts: List[Set[vm_cfg.Register]]) -> Set[vm_cfg.Register]:
+            return set().union(*facts)
+
+        flow = vm_cfg.Dataflow(
+            cfg,
+            False,
+            cfg.specials & tracked,
+            set(),
+            union,
+            lambda number, live: sweep(number, live, []),
+        ).solve()
+        result: List[Insn] = []
+        for block in cfg.blocks:
+            kept: List[Insn] = []
+            sweep(block.number, flow.outs.get(block.number, tracked), kept)
+            if len(kept) < block.end - block.start:
+                self.stats["dead"] += block.end - block.start - len(kept)
+            result += reversed(kept)
+        return result
+
+
+class Outcome(NamedTuple):
+    output: str
+    error: str
+    registers: Dict[str, int]
+    cells: List[int]
+    # what the run raised, for the caller to raise in turn
+    raised: Optional[Exception] = None
+
+
+def outcome(
+    insns: List[Insn],
+    memory: Memory,
+    regs: Mapping[str, int],
+    engine: str,
+    int64: bool,
+) -> Outcome:
+    # what a run shows: its output, how it failed, the special registers and
+    # the cells below the initial SP, where arguments and results live
+    output = io.StringIO()
+    error = ""
+    raised: Optional[Exception] = None
+    exe = Execution(insns, memory, dict(regs), engine, int64)
+    with contextlib.redirect_stdout(output):
+        try:
+            exe.run()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raised = e
+    # RA holds a code address, which moves as code is removed
+    specials = {
+        name: exe.regs[name] for name in special_registers if name != "RA"
+    }
+    if error:
+        # where a fault stops depends on the code before it
+        specials = {}
+    cells = list(memory[: regs.get("SP", 0)])
+    return Outcome(output.getvalue(), error, specials, cells, raised)
+
+
+def verify(
+    original: List[Insn],
+    optimized: List[Insn],
+    memory: Callable[[], Memory],
+    regs: Mapping[str, int],
+    engine: str = "interp",
+    int64: bool = False,
+) -> Outcome:
+    # Runs both programs on fresh memory and raises if they differ in what
+    # they show; returns what the original did.
+    before = outcome(original, memory(), regs, engine, int64)
+    after = outcome(optimized, memory(), regs, engine, int64)
+    for name in Outcome._fields[:-1]:
+        a, b = getattr(before, name), getattr(after, name)
+        if a != b:
+            raise Exception(
+                f"Optimized program diverges in {name}: {a!r} != {b!r}"
+            )
+    return before
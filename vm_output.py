@@ -0,0 +1,128 @@
+import sys
+from array import array
+from typing import BinaryIO, List, Optional, TextIO
+
+from .vm_insns import Output
+
+# sinks that write to a stream
+kinds = ["print", "text", "binary"]
+
+# values held before a bulk write
+default_buffer = 1 << 16
+
+
+class Sink:
+    # Where Print sends values.  write is called once per value, so each
+    # sink binds it to as little work as it can; flush writes out what is
+    # buffered and runs when a program halts or raises.  close is called
+    # once the sink is done with.
+    write: Output
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+
+class PrintSink(Sink):
+    # a print() per value, to whatever sys.stdout is at the time
+    def __init__(self) -> None:
+        self.write = print
+
+
+class ListSink(Sink):
+    # values kept in memory, in order
+    def __init__(self) -> None:
+        self.values: List[int] = []
+        self.write = self.values.append
+
+
+class TextSink(Sink):
+    # Values as decimal lines, as print() writes them, gathered and written
+    # buffer values at a time.  Without a stream they go to sys.stdout as
+    # it is at flush time.
+    def __init__(
+        self,
+        stream: Optional[TextIO] = None,
+        buffer: int = default_buffer,
+        owned: bool = False,
+    ):
+        self.stream: Optional[TextIO] = stream
+        self.buffer: int = buffer
+        # whether close closes the stream as well
+        self.owned: bool = owned
+        self.values: List[int] = []
+
+    def write(self, value: int) -> None:  # type: ignore
+        values = self.values
+        values.append(value)
+        if len(values) >= self.buffer:
+            self.flush()
+
+    def flush(self) -> None:
+        stream = self.stream or sys.stdout
+        if self.values:
+            stream.write("\n".join(map(str, self.values)) + "\n")
+            self.values.clear()
+        stream.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self.owned and self.stream is not None:
+            self.stream.close()
+
+
+class BinarySink(Sink):
+    # Values as raw native-endian int64s, gathered and written buffer values
+    # at a time; one outside 64 bits raises OverflowError from its Print.
+    # Without a stream they go to sys.stdout's binary buffer.
+    def __init__(
+        self,
+        stream: Optional[BinaryIO] = None,
+        buffer: int = default_buffer,
+        owned: bool = False,
+    ):
+        self.stream: Optional[BinaryIO] = stream
+        self.buffer: int = buffer
+        # whether close closes the stream as well
+        self.owned: bool = owned
+        self.values: array = array("q")
+
+    def write(self, value: int) -> None:  # type: ignore
+        values = self.values
+        values.append(value)
+        if len(values) >= self.buffer:
+            self.flush()
+
+    def flush(self) -> None:
+        stream = self.stream or sys.stdout.buffer
+        if self.values:
+            stream.write(self.values.tobytes())
+            self.values = array("q")
+        stream.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self.owned and self.stream is not None:
+            self.stream.close()
+
+
+def sink(
+    kind: str = "print",
+    path: Optional[str] = None,
+    buffer: int = default_buffer,
+) -> Sink:
+    # path, if given, is opened for the sink and closed by its close()
+    if kind == "print":
+        if path is not None:
+            raise Exception("print output goes to stdout only")
+        return PrintSink()
+    owned = path is not None
+    if kind == "text":
+        stream = None if path is None else open(path, "w")
+        return TextSink(stream, buffer, owned)
+    if kind == "binary":
+        stream = None if path is None else open(path, "wb")
+        return BinarySink(stream, buffer, owned)
+    raise Exception(f"Unknown output kind: {kind}")
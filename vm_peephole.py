@@ -0,0 +1,303 @@
+import dataclasses
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+from .vm_compile import operations, transfers
+from .vm_insns import *
+
+# Instructions whose only effect is writing dst, so they can be dropped when
+# that write is dead.  Div is not among them as it can raise.
+pure = (
+    Immediate,
+    LoadLabel,
+    Move,
+    Add,
+    AddImmediate,
+    Sub,
+    Mul,
+    Negate,
+    LessThan,
+    GreaterThan,
+    LessThanEqual,
+    GreaterThanEqual,
+    Equal,
+    NotEqual,
+    Not,
+)
+
+# produce 0 or 1
+comparisons = (
+    LessThan,
+    GreaterThan,
+    LessThanEqual,
+    GreaterThanEqual,
+    Equal,
+    NotEqual,
+)
+
+branches = (JumpIfZero, JumpIfNotZero)
+jumps = (Jump, JumpIfZero, JumpIfNotZero)
+
+# never treated as dead: the host and the calling convention read them
+preserved = set(special_registers)
+
+
+def reads(insn: Insn) -> Set[str]:
+    return {getattr(insn, field) for field in insn.uses}
+
+
+def writes(insn: Insn) -> Set[str]:
+    written = {getattr(insn, field) for field in insn.defs}
+    if isinstance(insn, (Call, CallIndirect)):
+        written.add("RA")
+    return written
+
+
+def ends_block(insn: Insn) -> bool:
+    return transfers(insn)
+
+
+def writes_pc(insns: List[Insn]) -> bool:
+    # jumps made by writing PC as a register are not modelled
+    return any("PC" in writes(insn) for insn in insns)
+
+
+def evaluate(insn: Insn, values: Tuple[int, ...]) -> int:
+    # the spec's expression for insn applied to constant operands
+    operation = operations()[type(insn).__name__]
+    names = dict(zip(operation.stack.before, values))
+    return eval(operation.stack.after[0], {}, names)
+
+
+def dead_after(insns: List[Insn], i: int, register: str) -> bool:
+    # Whether the value register holds after insns[i] is overwritten before
+    # anything can read it, looking no further than the end of the block.
+    if register in preserved:
+        return False
+    for insn in insns[i + 1 :]:
+        if isinstance(insn, Label) or register in reads(insn):
+            return False
+        if register in writes(insn):
+            return True
+        if ends_block(insn):
+            return False
+    return False
+
+
+class Peephole:
+    # Rewrites naive code a block at a time, counting every rewrite in
+    # stats.  Deleting instructions moves the ones after them, so programs
+    # must only jump indirectly to label values and return addresses, not
+    # to addresses computed from them; programs that write PC as a register
+    # are left as they are.
+    def __init__(self, max_passes: int = 10):
+        self.max_passes: int = max_passes
+        self.stats: Counter[str] = Counter()
+
+    def run(self, insns: List[Insn]) -> List[Insn]:
+        if writes_pc(insns):
+            return insns
+        for _ in range(self.max_passes):
+            before = sum(self.stats.values())
+            insns = [insn for insn in insns if not self.noop(insn)]
+            insns = self.forward(insns)
+            insns = self.dead(insns)
+            insns = self.thread(insns)
+            insns = self.fallthrough(insns)
+            if sum(self.stats.values()) == before:
+                break
+        return insns
+
+    def noop(self, insn: Insn) -> bool:
+        if isinstance(insn, Noop):
+            self.stats["noop"] += 1
+            return True
+        return False
+
+    def forward(self, insns: List[Insn]) -> List[Insn]:
+        # Within a block, track constants, copies, registers holding 0 or 1,
+        # and registers holding a test of another register, and use them to
+        # simplify each instruction.
+        result: List[Insn] = []
+        constants: Dict[str, int] = {}
+        copies: Dict[str, str] = {}
+        booleans: Set[str] = set()
+        # register -> (register tested, whether it is 1 when that is zero)
+        tests: Dict[str, Tuple[str, bool]] = {}
+        for insn in insns:
+            if isinstance(insn, Label):
+                constants, copies, booleans, tests = {}, {}, set(), {}
+                result.append(insn)
+                continue
+            insn = self.propagate(insn, copies)
+            insn = self.simplify(insn, constants, tests)
+            if insn is None:
+                continue
+            result.append(insn)
+            if ends_block(insn):
+                constants, copies, booleans, tests = {}, {}, set(), {}
+                continue
+            for register in writes(insn):
+                constants.pop(register, None)
+                copies.pop(register, None)
+                booleans.discard(register)
+                tests.pop(register, None)
+                for name, source in list(copies.items()):
+                    if source == register:
+                        del copies[name]
+                for name, (tested, _) in list(tests.items()):
+                    if tested == register:
+                        del tests[name]
+            self.learn(insn, constants, copies, booleans, tests)
+        return result
+
+    def propagate(self, insn: Insn, copies: Dict[str, str]) -> Insn:
+        changes: Dict[str, str] = {}
+        for field in insn.uses:
+            register = getattr(insn, field)
+            if register in copies:
+                changes[field] = copies[register]
+        if not changes:
+            return insn
+        self.stats["copy"] += 1
+        return dataclasses.replace(insn, **changes)
+
+    def simplify(
+        self,
+        insn: Insn,
+        constants: Dict[str, int],
+        tests: Dict[str, Tuple[str, bool]],
+    ) -> Optional[Insn]:
+        if isinstance(insn, Move) and insn.dst == insn.x:
+            self.stats["self-move"] += 1
+            return None
+        if isinstance(insn, Add) and insn.x != insn.y:
+            for x, y in ((insn.x, insn.y), (insn.y, insn.x)):
+                if y in constants:
+                    self.stats["add-immediate"] += 1
+                    value = constants[y]
+                    return AddImmediate(insn.dst, x, value, insn.comment)
+        if isinstance(insn, Sub) and insn.y in constants:
+            self.stats["add-immediate"] += 1
+            value = -constants[insn.y]
+            return AddImmediate(insn.dst, insn.x, value, insn.comment)
+        if isinstance(insn, AddImmediate) and insn.value == 0:
+            self.stats["add-zero"] += 1
+            if insn.dst == insn.x:
+                return None
+            return Move(insn.dst, insn.x, insn.comment)
+        if isinstance(insn, branches):
+            taken_on_zero = isinstance(insn, JumpIfZero)
+            if insn.v in constants:
+                self.stats["constant-branch"] += 1
+                if (constants[insn.v] == 0) == taken_on_zero:
+                    return Jump(insn.label, insn.comment)
+                return None
+            if insn.v in tests:
+                # v is 1 exactly when (or unless) tested is zero
+                tested, on_zero = tests[insn.v]
+                self.stats["branch-test"] += 1
+                if on_zero == taken_on_zero:
+                    return JumpIfNotZero(tested, insn.label, insn.comment)
+                return JumpIfZero(tested, insn.label, insn.comment)
+        return insn
+
+    def learn(
+        self,
+        insn: Insn,
+        constants: Dict[str, int],
+        copies: Dict[str, str],
+        booleans: Set[str],
+        tests: Dict[str, Tuple[str, bool]],
+    ) -> None:
+        if isinstance(insn, Immediate):
+            constants[insn.dst] = insn.value
+            if insn.value in (0, 1):
+                booleans.add(insn.dst)
+        elif isinstance(insn, Move):
+            # PC read later is another value
+            if insn.x != "PC":
+                copies[insn.dst] = insn.x
+            if insn.x in constants:
+                constants[insn.dst] = constants[insn.x]
+            if insn.x in booleans:
+                booleans.add(insn.dst)
+        elif isinstance(insn, comparisons):
+            booleans.add(insn.dst)
+            if insn.x in constants and insn.y in constants:
+                values = (constants[insn.x], constants[insn.y])
+                constants[insn.dst] = evaluate(insn, values)
+            elif isinstance(insn, (Equal, NotEqual)) and insn.dst not in (
+                insn.x,
+                insn.y,
+            ):
+                for x, y in ((insn.x, insn.y), (insn.y, insn.x)):
+                    if constants.get(y) == 0:
+                        tests[insn.dst] = (x, isinstance(insn, Equal))
+        elif isinstance(insn, Not) and insn.v in booleans:
+            booleans.add(insn.dst)
+            if insn.v in constants:
+                constants[insn.dst] = evaluate(insn, (constants[insn.v],))
+            elif insn.dst != insn.v:
+                tests[insn.dst] = (insn.v, True)
+
+    def dead(self, insns: List[Insn]) -> List[Insn]:
+        # writes that are overwritten within the block, or to registers the
+        # program never reads
+        read: Set[str] = set(preserved)
+        for insn in insns:
+            read |= reads(insn)
+        result: List[Insn] = []
+        for i, insn in enumerate(insns):
+            if isinstance(insn, pure) and (
+                insn.dst not in read or dead_after(insns, i, insn.dst)
+            ):
+                self.stats["dead"] += 1
+                continue
+            result.append(insn)
+        return result
+
+    def thread(self, insns: List[Insn]) -> List[Insn]:
+        # retarget jumps to labels that start with an unconditional jump
+        first: Dict[str, Insn] = {}
+        following: Optional[Insn] = None
+        for insn in reversed(insns):
+            if not isinstance(insn, Label):
+                following = insn
+            elif following is not None:
+                first[insn.label] = following
+
+        def final(label: str) -> str:
+            seen: Set[str] = {label}
+            while isinstance(first.get(label), Jump):
+                label = first[label].label  # type: ignore
+                if label in seen:
+                    break
+                seen.add(label)
+            return label
+
+        result: List[Insn] = []
+        for insn in insns:
+            if isinstance(insn, jumps):
+                target = final(insn.label)
+                if target != insn.label:
+                    self.stats["thread"] += 1
+                    insn = dataclasses.replace(insn, label=target)
+            result.append(insn)
+        return result
+
+    def fallthrough(self, insns: List[Insn]) -> List[Insn]:
+        # drop jumps to the labels right after them
+        result: List[Insn] = []
+        for i, insn in enumerate(insns):
+            if isinstance(insn, jumps):
+                following: Set[str] = set()
+                for x in insns[i + 1 :]:
+                    if not isinstance(x, Label):
+                        break
+                    following.add(x.label)
+                if insn.label in following:
+                    self.stats["fallthrough"] += 1
+                    continue
+            result.append(insn)
+        return result
@@ -0,0 +1,188 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, TextIO, Tuple
+
+from . import vm_link
+from .vm_insns import *
+
+# name of the code that runs before the first call
+entry = "<main>"
+
+
+@dataclass
+class FunctionStats:
+    calls: int = 0
+    steps: int = 0
+    self_ns: int = 0
+    total_ns: int = 0
+    # activations currently on the call stack, so recursion is not counted
+    # twice in total_ns
+    depth: int = field(default=0, repr=False)
+
+
+@dataclass
+class Profile:
+    program: vm_link.Program
+    # the instructions as parsed, for the report
+    insns: List[Insn]
+    # per program index
+    counts: List[int]
+    times: List[int]
+    functions: Dict[str, FunctionStats]
+    total_ns: int = 0
+
+    def steps(self) -> int:
+        return sum(self.counts)
+
+    def opcodes(self) -> Dict[str, Tuple[int, int]]:
+        # opcode -> (count, ns)
+        totals: Dict[str, Tuple[int, int]] = {}
+        for insn, count, ns in zip(
+            self.program.insns, self.counts, self.times
+        ):
+            name = type(insn).__name__
+            n, t = totals.get(name, (0, 0))
+            totals[name] = (n + count, t + ns)
+        return totals
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps(),
+            "total_ns": self.total_ns,
+            "functions": {
+                name: {
+                    "calls": stats.calls,
+                    "steps": stats.steps,
+                    "self_ns": stats.self_ns,
+                    "total_ns": stats.total_ns,
+                }
+                for name, stats in self.functions.items()
+            },
+            "opcodes": {
+                name: {"count": count, "ns": ns}
+                for name, (count, ns) in self.opcodes().items()
+            },
+            "instructions": [
+                {
+                    "pc": pc,
+                    "index": index,
+                    "insn": self.insns[index].disasm(),
+                    "count": count,
+                    "ns": ns,
+                }
+                for pc, (index, count, ns) in enumerate(
+                    zip(self.program.origin, self.counts, self.times)
+                )
+            ],
+        }
+
+    def report(self, f: TextIO, top: int = 20) -> None:
+        ms = 1e-6
+        print(
+            f"Profile: {self.steps()} steps in {self.total_ns * ms:.3f} ms",
+            file=f,
+        )
+        print("Functions:", file=f)
+        header = ["calls", "steps", "self ms", "total ms"]
+        print("{:>10} {:>12} {:>10} {:>10}  name".format(*header), file=f)
+        ranked = sorted(
+            self.functions.items(), key=lambda item: -item[1].self_ns
+        )
+        for name, stats in ranked:
+            self_ms, total_ms = stats.self_ns * ms, stats.total_ns * ms
+            print(
+                f"{stats.calls:10} {stats.steps:12} {self_ms:10.3f}"
+                f" {total_ms:10.3f}  {name}",
+                file=f,
+            )
+        print("Opcodes:", file=f)
+        print(f"{'count':>12} {'ms':>10}  opcode", file=f)
+        opcodes = sorted(self.opcodes().items(), key=lambda item: -item[1][1])
+        for name, (count, ns) in opcodes:
+            if count:
+                print(f"{count:12} {ns * ms:10.3f}  {name}", file=f)
+        print(f"Instructions (top {top} by time):", file=f)
+        print(f"{'index':>7} {'count':>12} {'ms':>10}  insn", file=f)
+        pcs = sorted(range(len(self.times)), key=lambda pc: -self.times[pc])
+        for pc in pcs[:top]:
+            if not self.counts[pc]:
+                break
+            index = self.program.origin[pc]
+            count, pc_ms = self.counts[pc], self.times[pc] * ms
+            print(
+                f"[{index:5}] {count:12} {pc_ms:10.3f}"
+                f"  {self.insns[index].disasm()}",
+                file=f,
+            )
+
+
+def function_names(program: vm_link.Program) -> Dict[int, str]:
+    names: Dict[int, str] = {}
+    for label, pc in program.labels.items():
+        names.setdefault(pc, label)
+    return names
+
+
+def profile(
+    program: vm_link.Program,
+    insns: List[Insn],
+    memory: Memory,
+    registers: Registers,
+    output: Output,
+) -> Profile:
+    # The interpreter loop, timing every instruction.  A Call/CallIndirect
+    # enters the function named by the label at its target; a JumpIndirect
+    # to the return address of the innermost call leaves it.  The clock is
+    # read again after the bookkeeping, so that is charged to no
+    # instruction; reading the clock is charged to the one before it.
+    code: List[Insn] = program.insns
+    counts: List[int] = [0] * len(code)
+    times: List[int] = [0] * len(code)
+    names = function_names(program)
+    functions: Dict[str, FunctionStats] = {entry: FunctionStats(depth=1)}
+    calls = {
+        pc for pc, i in enumerate(code) if isinstance(i, (Call, CallIndirect))
+    }
+    returns = {pc for pc, i in enumerate(code) if isinstance(i, JumpIndirect)}
+    # (return pc, caller, callee, entry time)
+    stack: List[Tuple[int, FunctionStats, FunctionStats, int]] = []
+    current: FunctionStats = functions[entry]
+    clock = time.perf_counter_ns
+
+    start = last = clock()
+    pc: int = registers[PC]
+    while pc != HALT:
+        registers[PC] = pc + 1
+        code[pc].execute(memory, registers, output)
+        now = clock()
+        elapsed = now - last
+        counts[pc] += 1
+        times[pc] += elapsed
+        current.steps += 1
+        current.self_ns += elapsed
+        if pc in calls:
+            target = registers[PC]
+            name = names.get(target, f"pc{target}")
+            callee = functions.setdefault(name, FunctionStats())
+            callee.calls += 1
+            callee.depth += 1
+            stack.append((pc + 1, current, callee, now))
+            current = callee
+        elif pc in returns and stack and registers[PC] == stack[-1][0]:
+            _, current, callee, entered = stack.pop()
+            callee.depth -= 1
+            if callee.depth == 0:
+                callee.total_ns += now - entered
+        pc = registers[PC]
+        last = clock()
+    end = clock()
+
+    # calls that never returned, and the entry code, end with the program
+    for _, _, callee, entered in reversed(stack):
+        callee.depth -= 1
+        if callee.depth == 0:
+            callee.total_ns += end - entered
+    functions[entry].total_ns = end - start
+    functions[entry].depth = 0
+    registers[PC] = pc
+    return Profile(program, insns, counts, times, functions, end - start)
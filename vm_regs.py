@@ -0,0 +1,49 @@
+from typing import Dict, Iterable, Iterator, Mapping, MutableMapping
+
+from .vm_insns import Insn, Registers, special_registers
+
+
+def number_registers(
+    insns: Iterable[Insn], initial: Iterable[str] = ()
+) -> Dict[str, int]:
+    # special registers come first so they line up with PC/FP/SP/RA
+    slots: Dict[str, int] = {}
+    for name in special_registers:
+        slots[name] = len(slots)
+    for name in initial:
+        slots.setdefault(name, len(slots))
+    for insn in insns:
+        for field in insn.defs + insn.uses:
+            slots.setdefault(getattr(insn, field), len(slots))
+    return slots
+
+
+class RegisterFile(MutableMapping[str, int]):
+    # name-based view of the flat `cells` list that the engines index
+
+    def __init__(self, slots: Dict[str, int], initial: Mapping[str, int] = {}):
+        self.slots: Dict[str, int] = slots
+        self.cells: Registers = [0] * len(slots)
+        for name, value in initial.items():
+            self[name] = value
+
+    def __getitem__(self, name: str) -> int:
+        return self.cells[self.slots[name]]
+
+    def __setitem__(self, name: str, value: int) -> None:
+        if name not in self.slots:
+            self.slots[name] = len(self.cells)
+            self.cells.append(0)
+        self.cells[self.slots[name]] = value
+
+    def __delitem__(self, name: str) -> None:
+        raise TypeError(f"Cannot delete register: {name}")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.slots)
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def __repr__(self) -> str:
+        return f"RegisterFile({dict(self)})"
@@ -0,0 +1,121 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import Iterator, List, Mapping, MutableMapping, Tuple
+
+from .vm_insns import Memory
+from .vm_memory import PagedMemory
+
+magic = b"VMSNAP01"
+
+# magic, memory size, region size, register count, region count, names size
+header = struct.Struct("<8sQQQQQ")
+# address, cell count, file offset
+region = struct.Struct("<QQQ")
+
+# granularity at which flat (list/array) memory is checked for contents
+chunk = 4096
+
+
+def align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def regions(memory: Memory) -> Iterator[Tuple[int, bytes]]:
+    # the touched parts of memory as (address, int64 cells) pairs
+    if isinstance(memory, PagedMemory):
+        for number in sorted(memory.pages):
+            page = memory.pages[number]
+            yield number << memory.shift, array("q", page).tobytes()
+        return
+    for address in range(0, len(memory), chunk):
+        cells = memory[address : address + chunk]
+        if any(cells):
+            yield address, array("q", cells).tobytes()
+
+
+def region_size(memory: Memory) -> int:
+    return memory.page_size if isinstance(memory, PagedMemory) else chunk
+
+
+def save(path: str, registers: Mapping[str, int], memory: Memory) -> None:
+    if sys.byteorder != "little":
+        raise Exception("Snapshots need a little-endian host")
+    names = "\0".join(registers).encode()
+    values = struct.pack(f"<{len(registers)}q", *registers.values())
+    data = list(regions(memory))
+    size = 0 if isinstance(memory, PagedMemory) else len(memory)
+    offset = align(header.size + len(names)) + len(values)
+    offset += region.size * len(data)
+    table: List[bytes] = []
+    for address, cells in data:
+        offset = align(offset)
+        table.append(region.pack(address, len(cells) // 8, offset))
+        offset += len(cells)
+    with open(path, "wb") as f:
+        f.write(
+            header.pack(
+                magic,
+                size,
+                region_size(memory),
+                len(registers),
+                len(data),
+                len(names),
+            )
+        )
+        f.write(names)
+        f.write(bytes(align(f.tell()) - f.tell()))
+        f.write(values)
+        f.write(b"".join(table))
+        for address, cells in data:
+            f.write(bytes(align(f.tell()) - f.tell()))
+            f.write(cells)
+
+
+def load(
+    path: str, registers: MutableMapping[str, int], memory: Memory
+) -> None:
+    # The file is mapped copy-on-write: paged memory uses the mapped pages
+    # directly, and a page is only copied if the VM writes to it.
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+    tag, size, cells, count, nregions, nnames = header.unpack_from(view)
+    if tag != magic:
+        raise Exception(f"Not a VM snapshot: {path}")
+    offset = header.size
+    names = bytes(view[offset : offset + nnames]).decode().split("\0")
+    offset = align(offset + nnames)
+    values = struct.unpack_from(f"<{count}q", view, offset)
+    offset += 8 * count
+    for name, value in zip(names, values):
+        registers[name] = value
+
+    table = [
+        region.unpack_from(view, offset + i * region.size)
+        for i in range(nregions)
+    ]
+    if isinstance(memory, PagedMemory):
+        memory.pages = {}
+        for address, length, start in table:
+            page = view[start : start + 8 * length].cast("q")
+            if length == memory.page_size and address % length == 0:
+                memory.pages[address >> memory.shift] = page
+            else:
+                for i, value in enumerate(page):
+                    memory[address + i] = value
+        return
+    if len(memory) < size:
+        raise Exception(f"Snapshot needs {size} memory cells")
+    if isinstance(memory, array):
+        memory[:] = array("q", bytes(8 * len(memory)))
+        for address, length, start in table:
+            cells = array("q")
+            cells.frombytes(view[start : start + 8 * length])
+            memory[address : address + length] = cells
+    else:
+        memory[:] = [0] * len(memory)
+        for address, length, start in table:
+            cells = view[start : start + 8 * length].cast("q")
+            memory[address : address + length] = cells.tolist()
@@ -0,0 +1,15 @@
+from typing import Iterator, TextIO
+
+from .scanner import StreamScanner
+from .vm_insns import Insn, reserved
+from .vm_parser import Parser
+
+
+def parse_file(file: TextIO) -> Iterator[Insn]:
+    return Parser(StreamScanner(file, reserved=reserved)).stream()
+
+
+def parse_path(path: str) -> Iterator[Insn]:
+    # the file stays open until the last instruction has been read
+    with open(path) as f:
+        yield from parse_file(f)
@@ -0,0 +1,430 @@
+from typing import Callable, Dict, List, TypeAlias
+
+from .vm_insns import *
+
+# A thunk executes one pre-linked instruction.  It receives the PC of the
+# following instruction and returns the PC to continue at.
+Thunk: TypeAlias = Callable[[int], int]
+
+
+def thread_Label(
+    insn: Label[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    label = insn.label
+
+    def op(pc: int) -> int:
+        return pc
+
+    return op
+
+
+def thread_Noop(
+    insn: Noop[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    def op(pc: int) -> int:
+        return pc
+
+    return op
+
+
+def thread_Jump(
+    insn: Jump[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    label = insn.label
+
+    def op(pc: int) -> int:
+        pc = label
+        return pc
+
+    return op
+
+
+def thread_JumpIfZero(
+    insn: JumpIfZero[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    v = insn.v
+    label = insn.label
+
+    def op(pc: int) -> int:
+        if registers[v] == 0:
+            pc = label
+        return pc
+
+    return op
+
+
+def thread_JumpIfNotZero(
+    insn: JumpIfNotZero[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    v = insn.v
+    label = insn.label
+
+    def op(pc: int) -> int:
+        if registers[v] != 0:
+            pc = label
+        return pc
+
+    return op
+
+
+def thread_JumpIndirect(
+    insn: JumpIndirect[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    v = insn.v
+
+    def op(pc: int) -> int:
+        pc = registers[v]
+        return pc
+
+    return op
+
+
+def thread_Immediate(
+    insn: Immediate[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    value = insn.value
+
+    def op(pc: int) -> int:
+        registers[dst] = value
+        return pc
+
+    return op
+
+
+def thread_LoadLabel(
+    insn: LoadLabel[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    label = insn.label
+
+    def op(pc: int) -> int:
+        registers[dst] = label
+        return pc
+
+    return op
+
+
+def thread_Move(
+    insn: Move[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x]
+        return pc
+
+    return op
+
+
+def thread_Add(
+    insn: Add[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x] + registers[y]
+        return pc
+
+    return op
+
+
+def thread_AddImmediate(
+    insn: AddImmediate[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    value = insn.value
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x] + value
+        return pc
+
+    return op
+
+
+def thread_Sub(
+    insn: Sub[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x] - registers[y]
+        return pc
+
+    return op
+
+
+def thread_Mul(
+    insn: Mul[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x] * registers[y]
+        return pc
+
+    return op
+
+
+def thread_Div(
+    insn: Div[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = registers[x] // registers[y]
+        return pc
+
+    return op
+
+
+def thread_Negate(
+    insn: Negate[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    v = insn.v
+
+    def op(pc: int) -> int:
+        registers[dst] = -registers[v]
+        return pc
+
+    return op
+
+
+def thread_LessThan(
+    insn: LessThan[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] < registers[y])
+        return pc
+
+    return op
+
+
+def thread_GreaterThan(
+    insn: GreaterThan[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] > registers[y])
+        return pc
+
+    return op
+
+
+def thread_LessThanEqual(
+    insn: LessThanEqual[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] <= registers[y])
+        return pc
+
+    return op
+
+
+def thread_GreaterThanEqual(
+    insn: GreaterThanEqual[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] >= registers[y])
+        return pc
+
+    return op
+
+
+def thread_Equal(
+    insn: Equal[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] == registers[y])
+        return pc
+
+    return op
+
+
+def thread_NotEqual(
+    insn: NotEqual[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    x = insn.x
+    y = insn.y
+
+    def op(pc: int) -> int:
+        registers[dst] = int(registers[x] != registers[y])
+        return pc
+
+    return op
+
+
+def thread_Not(
+    insn: Not[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    v = insn.v
+
+    def op(pc: int) -> int:
+        registers[dst] = 1 - registers[v]
+        return pc
+
+    return op
+
+
+def thread_Load(
+    insn: Load[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    dst = insn.dst
+    address = insn.address
+
+    def op(pc: int) -> int:
+        registers[dst] = memory[registers[address]]
+        return pc
+
+    return op
+
+
+def thread_Store(
+    insn: Store[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    address = insn.address
+    v = insn.v
+
+    def op(pc: int) -> int:
+        memory[registers[address]] = registers[v]
+        return pc
+
+    return op
+
+
+def thread_Print(
+    insn: Print[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    v = insn.v
+
+    def op(pc: int) -> int:
+        output(registers[v])
+        return pc
+
+    return op
+
+
+def thread_CallIndirect(
+    insn: CallIndirect[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    v = insn.v
+
+    def op(pc: int) -> int:
+        registers[RA] = pc
+        pc = registers[v]
+        return pc
+
+    return op
+
+
+def thread_Call(
+    insn: Call[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    label = insn.label
+
+    def op(pc: int) -> int:
+        registers[RA] = pc
+        pc = label
+        return pc
+
+    return op
+
+
+def thread_Halt(
+    insn: Halt[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    def op(pc: int) -> int:
+        pc = HALT
+        return pc
+
+    return op
+
+
+threaders: Dict[type, Callable[..., Thunk]] = {
+    Label: thread_Label,
+    Noop: thread_Noop,
+    Jump: thread_Jump,
+    JumpIfZero: thread_JumpIfZero,
+    JumpIfNotZero: thread_JumpIfNotZero,
+    JumpIndirect: thread_JumpIndirect,
+    Immediate: thread_Immediate,
+    LoadLabel: thread_LoadLabel,
+    Move: thread_Move,
+    Add: thread_Add,
+    AddImmediate: thread_AddImmediate,
+    Sub: thread_Sub,
+    Mul: thread_Mul,
+    Div: thread_Div,
+    Negate: thread_Negate,
+    LessThan: thread_LessThan,
+    GreaterThan: thread_GreaterThan,
+    LessThanEqual: thread_LessThanEqual,
+    GreaterThanEqual: thread_GreaterThanEqual,
+    Equal: thread_Equal,
+    NotEqual: thread_NotEqual,
+    Not: thread_Not,
+    Load: thread_Load,
+    Store: thread_Store,
+    Print: thread_Print,
+    CallIndirect: thread_CallIndirect,
+    Call: thread_Call,
+    Halt: thread_Halt,
+}
+
+
+def synced(
+    insn: Insn[int], memory: Memory, registers: Registers, output: Output
+) -> Thunk:
+    # An instruction naming PC as a register operand sees and sets
+    # registers[PC] as the interpreter keeps it.
+    def op(pc: int) -> int:
+        registers[PC] = pc
+        insn.execute(memory, registers, output)
+        return registers[PC]
+
+    return op
+
+
+def thread(
+    insns: List[Insn], memory: Memory, registers: Registers, output: Output
+) -> List[Thunk]:
+    return [
+        (
+            synced(insn, memory, registers, output)
+            if PC in [getattr(insn, field) for field in insn.defs + insn.uses]
+            else threaders[type(insn)](insn, memory, registers, output)
+        )
+        for insn in insns
+    ]
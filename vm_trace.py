@@ -0,0 +1,322 @@
+import dataclasses
+import hashlib
+import mmap
+import struct
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+from . import vm_link
+from .vm_compile import Compiler, jumps, mentions, operations, register
+from .vm_insns import *
+
+magic = b"VMTRACE2"
+
+# magic, record size, capacity in records, digest of the traced program
+header = struct.Struct("<8sII32s")
+
+# step (from 1; 0 marks an unused slot), pc, opcode, flags, destination
+# register, value written, memory address
+record = struct.Struct("<QiHHi4xqq")
+# the same layout with pc, opcode and flags as one field (see tag)
+packed = struct.Struct("<QQi4xqq")
+
+# flags
+DST = 1  # value was written to register dst
+ADDRESS = 2  # address was read or written
+STORE = 4  # value was written to memory[address]
+WIDE = 8  # value did not fit in 64 bits and was truncated
+FAULT = 16  # the instruction raised; nothing after it was recorded
+
+default_capacity = 1 << 20
+
+
+class Record(NamedTuple):
+    step: int
+    pc: int
+    opcode: int
+    flags: int
+    dst: int
+    value: int
+    address: int
+
+
+def truncate(value: int) -> int:
+    return ((value + 0x8000000000000000) & 0xFFFFFFFFFFFFFFFF) - (
+        0x8000000000000000
+    )
+
+
+def digest(program: vm_link.Program) -> bytes:
+    # what the recorded PCs and registers refer to: the linked instructions
+    # (comments aside), where each came from and the register names
+    h = hashlib.sha256()
+    for insn, index in zip(program.insns, program.origin):
+        values = [
+            getattr(insn, f.name)
+            for f in dataclasses.fields(insn)
+            if f.name != "comment"
+        ]
+        h.update(repr((type(insn).__name__, values, index)).encode())
+    h.update(repr(sorted(program.slots.items())).encode())
+    return h.digest()
+
+
+def tag(pc: int, opcode: int, flags: int) -> int:
+    # pc, opcode and flags as the one 64-bit field packed writes for them
+    return (pc & 0xFFFFFFFF) | opcode << 32 | flags << 48
+
+
+def describe(
+    pc: int, insn: Insn, opcodes: Dict[str, int]
+) -> Tuple[int, int, int, bool]:
+    # tag, register whose value is recorded, register holding the address,
+    # and whether the value is the memory cell written; instructions that
+    # write no register record the next PC
+    name = type(insn).__name__
+    flags = 0
+    dst = PC
+    slot = PC
+    if insn.defs:
+        flags |= DST
+        dst = getattr(insn, insn.defs[0])
+    elif mentions(name, "RA"):
+        flags |= DST
+        dst = RA
+    if "address" in insn.uses:
+        flags |= ADDRESS
+        slot = getattr(insn, "address")
+        if not insn.defs:
+            flags |= STORE
+    return tag(pc, opcodes[name], flags), dst, slot, bool(flags & STORE)
+
+
+class Tracer:
+    # Keeps the last capacity steps in a ring of fixed-size records, in
+    # memory or, given a path, in a shared file mapping that survives the
+    # process.  Programs run as compiled blocks that write the records
+    # inline, whatever engine the Execution was set up with.
+    def __init__(self, capacity: int = default_capacity, path: str = ""):
+        self.capacity: int = capacity
+        self.steps: int = 0
+        size = header.size + capacity * record.size
+        self.buffer: bytearray | mmap.mmap
+        if path:
+            with open(path, "w+b") as f:
+                f.truncate(size)
+                self.buffer = mmap.mmap(f.fileno(), size)
+        else:
+            self.buffer = bytearray(size)
+        self.mark(bytes(32))  # no program yet
+
+    def mark(self, program: bytes) -> None:
+        header.pack_into(
+            self.buffer, 0, magic, record.size, self.capacity, program
+        )
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def run(
+        self,
+        program: vm_link.Program,
+        memory: Memory,
+        registers: Registers,
+        output: Output,
+        int64: bool = False,
+    ) -> None:
+        self.mark(digest(program))
+        compiler = TracingCompiler(program, self, int64)
+        blocks = compiler.compile(memory, registers, output)
+        pc: int = registers[PC]
+        try:
+            while pc != HALT:
+                pc = blocks[pc]()
+        except BaseException:
+            self.steps = compiler.namespace["step"]  # type: ignore
+            self.fault(compiler, pc)
+            raise
+        self.steps = compiler.namespace["step"]  # type: ignore
+        registers[PC] = pc
+
+    def offset(self, step: int) -> int:
+        return header.size + step % self.capacity * record.size
+
+    def at(self, step: int) -> Record:
+        return Record(*record.unpack_from(self.buffer, self.offset(step)))
+
+    def fault(self, compiler: "TracingCompiler", start: int) -> None:
+        # A block stores its step count on the way out, so one that raised
+        # left it behind; the records it did write carry the true count.
+        while self.at(self.steps + 1).step == self.steps + 1:
+            self.steps += 1
+        # The instruction that raised is the one after the last recorded,
+        # unless that one ended a block and start is the next.
+        pc = start
+        if self.steps:
+            last = self.at(self.steps)
+            if not jumps(compiler.program.insns[last.pc]):
+                pc = last.pc + 1
+        meta = compiler.meta
+        opcode = meta[pc][0] >> 32 & 0xFFFF if 0 <= pc < len(meta) else 0
+        self.steps += 1
+        packed.pack_into(
+            self.buffer,
+            self.offset(self.steps),
+            self.steps,
+            tag(pc, opcode, FAULT),
+            0,
+            0,
+            0,
+        )
+
+
+class TracingCompiler(Compiler):
+    # compiled blocks that also write a record for every instruction
+    def __init__(
+        self, program: vm_link.Program, tracer: Tracer, int64: bool = False
+    ):
+        super().__init__(program, int64)
+        opcodes = {name: i for i, name in enumerate(operations())}
+        self.meta: List[Tuple[int, int, int, bool]] = [
+            describe(pc, insn, opcodes)
+            for pc, insn in enumerate(program.insns)
+        ]
+        self.capacity: int = tracer.capacity
+        self.namespace.update(
+            step=tracer.steps,
+            buffer=tracer.buffer,
+            pack=packed.pack_into,
+            error=struct.error,
+            truncate=truncate,
+        )
+
+    def instruction(self, pc: int) -> List[str]:
+        t, dst, slot, stored = self.meta[pc]
+        flags = t >> 48
+        lines: List[str] = []
+        address = "0"
+        if flags & ADDRESS:
+            # before the instruction, which may overwrite the register
+            where = str(pc + 1) if slot == PC else register(slot)
+            lines.append(f"address = {where}")
+            address = "address"
+        lines += super().instruction(pc)
+        if stored:
+            value = "memory[address]"
+        elif flags & DST:
+            value = register(dst)
+        elif jumps(self.program.insns[pc]):
+            value = "pc"
+        else:
+            value = str(pc + 1)
+        offset = f"{header.size} + n % {self.capacity} * {record.size}"
+        fields = f"{dst}, {value}, {address}"
+        wide = f"{dst}, truncate({value}), truncate({address})"
+        lines += [
+            "n += 1",
+            "try:",
+            f"    pack(buffer, {offset}, n, {t}, {fields})",
+            "except error:",
+            f"    pack(buffer, {offset}, n, {t | WIDE << 48}, {wide})",
+        ]
+        return lines
+
+    def block_source(self, start: int) -> List[str]:
+        # the step count is kept in a local and stored back on the way out
+        lines = super().block_source(start)
+        entry = ["    global step", "    n = step"]
+        return lines[:1] + entry + lines[1:-1] + ["    step = n"] + lines[-1:]
+
+
+def records(data: bytes) -> Tuple[bytes, List[Record]]:
+    # the digest of the traced program and the surviving records, oldest
+    # first
+    kind, size, capacity, program = header.unpack_from(data)
+    if kind != magic or size != record.size:
+        raise Exception("Not a VM trace")
+    found = [
+        Record(*record.unpack_from(data, header.size + i * size))
+        for i in range(capacity)
+    ]
+    return program, sorted((r for r in found if r.step), key=lambda r: r.step)
+
+
+def load(path: str) -> Tuple[bytes, List[Record]]:
+    with open(path, "rb") as f:
+        return records(f.read())
+
+
+class State:
+    # registers and memory cells as far as the trace has revealed them
+    def __init__(self, slots: Dict[str, int]):
+        self.names: Dict[int, str] = {
+            slot: name for name, slot in slots.items()
+        }
+        self.registers: Dict[int, int] = {}
+        self.memory: Dict[int, int] = {}
+
+    def apply(self, r: Record) -> None:
+        if r.flags & FAULT:
+            return
+        if r.flags & DST:
+            self.registers[r.dst] = r.value
+            if r.flags & ADDRESS:
+                self.memory[r.address] = r.value
+        if r.flags & STORE:
+            self.memory[r.address] = r.value
+
+    def cells(self, start: int, end: int) -> List[Optional[int]]:
+        return [self.memory.get(a) for a in range(start, end)]
+
+    def dump(self, f: TextIO) -> None:
+        regs = {
+            name: self.registers.get(slot)
+            for slot, name in sorted(self.names.items())
+        }
+        fp, sp = regs.get("FP"), regs.get("SP")
+        frame: List[Optional[int]] = []
+        caller: List[Optional[int]] = []
+        if fp is not None and sp is not None:
+            frame = self.cells(fp, sp)[:20]
+            start = self.memory.get(fp + 1)
+            if fp != 0 and start is not None:
+                caller = self.cells(start, fp)
+        print(f"      regs  = {regs}", file=f)
+        print(f"      frame = {frame}", file=f)
+        print(f"      caller= {caller}", file=f)
+
+
+def replay(
+    trace: List[Record],
+    insns: List[Insn],
+    program: vm_link.Program,
+    f: TextIO,
+    state: bool = False,
+    skip: int = 0,
+) -> None:
+    # the dump_state view of each traced step, with None for registers and
+    # memory the trace has not yet shown; the first skip records only add
+    # to what is known
+    known = State(program.slots)
+    for r in trace[:skip]:
+        known.apply(r)
+    for r in trace[skip:]:
+        known.registers[PC] = r.pc
+        if state:
+            known.dump(f)
+        if 0 <= r.pc < len(program.origin):
+            index = program.origin[r.pc]
+            text = f"[{index:4}] {insns[index].disasm()}"
+        else:
+            text = f"[????] invalid PC {r.pc}"
+        note = ""
+        if r.flags & FAULT:
+            note = "  !! raised"
+        elif r.flags & STORE:
+            note = f"  ; memory[{r.address}] = {r.value}"
+        elif r.flags & DST:
+            note = f"  ; {known.names[r.dst]} = {r.value}"
+        if r.flags & WIDE:
+            note += " (truncated)"
+        print(f"#{r.step:<10} {text}{note}", file=f)
+        known.apply(r)
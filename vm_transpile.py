@@ -0,0 +1,122 @@
+import importlib.util
+import os
+import py_compile
+from types import ModuleType
+from typing import List, Mapping, Optional
+
+from . import vm_cache, vm_link, vm_output, vm_regs
+from .vm_compile import Compiler, local, names_pc
+from .vm_insns import *
+from .vm_parser import Parser
+from .scanner import Scanner
+
+# bump when the generated module changes shape
+version = 4
+
+prologue = """\
+# Generated by vm_transpile; do not edit.
+
+HALT = {halt}
+
+slots = {slots!r}
+
+
+def run(memory, registers, output):
+    {locals} = registers[:{count}]
+    pc = {pc}
+    while True:
+        match pc:
+"""
+
+epilogue = """\
+            case _:
+                break
+    if pc != HALT:
+        raise Exception(f"Invalid jump target: {{pc}}")
+    {pc} = pc
+    registers[:{count}] = [{locals}]
+"""
+
+
+def transpile(program: vm_link.Program, int64: bool = False) -> str:
+    compiler = Compiler(program, int64)
+    names = [local(slot) for slot in range(len(program.slots))]
+    fields = {
+        "halt": HALT,
+        "slots": program.slots,
+        "locals": ", ".join(names),
+        "count": len(names),
+        "pc": local(PC),
+    }
+    lines: List[str] = [prologue.format(**fields)]
+    # arithmetic on PC may land anywhere, not only on a block leader
+    starts = sorted(compiler.leaders)
+    if any(names_pc(insn, insn.defs) for insn in program.insns):
+        starts = list(range(len(program.insns)))
+    for start in starts:
+        lines.append(f"            case {start}:\n")
+        for stmt in compiler.block_body(start):
+            lines.append(f"                {stmt}\n")
+    lines.append(epilogue.format(**fields))
+    return "".join(lines)
+
+
+def load_module(path: str) -> ModuleType:
+    # the regular source loader keeps the compiled .pyc in __pycache__
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def cached_module(
+    source: str,
+    directory: str = vm_cache.default_dir,
+    limit: int = vm_cache.default_limit,
+    int64: bool = False,
+) -> ModuleType:
+    semantics = "int64" if int64 else "int"
+    key = vm_cache.digest(
+        source, vm_cache.spec_digest(), f"py{version}", semantics
+    )
+    path = os.path.join(directory, f"vm_{key[:40]}.py")
+    if not os.path.exists(path):
+        insns: List[Insn] = Parser(Scanner(source, reserved=reserved)).parse()
+        program = vm_link.link(insns)
+        vm_cache.store(path, transpile(program, int64).encode())
+        compile_module(path)
+        vm_cache.evict(directory, limit, keep=path)
+    else:
+        os.utime(path)  # mark as recently used
+        if not os.path.exists(importlib.util.cache_from_source(path)):
+            compile_module(path)
+    return load_module(path)
+
+
+def compile_module(path: str) -> None:
+    # Compiled now, even when the interpreter is not writing bytecode.  The
+    # source is named by its digest and never changes, so the bytecode is
+    # not checked against it; touching the source to mark it used would
+    # otherwise make timestamp-checked bytecode stale.
+    py_compile.compile(
+        path,
+        doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+
+
+def execute(
+    module: ModuleType,
+    memory: Memory,
+    regs: Mapping[str, int],
+    output: Optional[vm_output.Sink] = None,
+) -> vm_regs.RegisterFile:
+    output = output or vm_output.PrintSink()
+    registers = vm_regs.RegisterFile(dict(module.slots), regs)
+    try:
+        module.run(memory, registers.cells, output.write)
+    finally:
+        output.flush()
+    return registers
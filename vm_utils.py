@@ -1,22 +1,33 @@
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional
 from collections import defaultdict
 
-from . import vm, vm_insns
+from . import vm, vm_batch, vm_insns, vm_link, vm_memory
 
 
-def invoke_vm(
-    insns: List[vm_insns.Insn], params: List[str], verbose: bool
-) -> None:
-    if verbose:
-        dump_insns(insns)
+def numbers(params: List[str]) -> List[int]:
     args: List[int] = []
-    for arg in reversed(params):
+    for arg in params:
         if arg.isnumeric():
             args.append(int(arg))
         else:
             raise Exception(f"Invalid argument: {arg}")
+    return args
+
+
+def invoke_vm(
+    insns: List[vm_insns.Insn],
+    params: List[str],
+    verbose: bool,
+    engine: str = "interp",
+    memory_size: Optional[int] = None,
+    memory_kind: str = "list",
+    int64: bool = False,
+) -> None:
+    args: List[int] = numbers(list(reversed(params)))
 
-    memory: List[int] = args + [0] * 100000
+    memory: vm_insns.Memory = vm_memory.allocate(
+        args, memory_size, memory_kind
+    )
     regs: Dict[str, int] = defaultdict(
         int,
         {
@@ -25,14 +36,43 @@ def invoke_vm(
             "SP": len(args) + 1,
         },
     )
-    exe = vm.Execution(insns, memory, regs)
+    exe = vm.Execution(insns, memory, regs, engine=engine, int64=int64)
+    if verbose:
+        dump_insns(insns, exe.program)
     exe.verbose = verbose
     exe.run()
     assert exe.regs["SP"] == len(args) + 1
 
 
-def dump_insns(insns: List[vm_insns.Insn]) -> None:
+def invoke_vm_batch(
+    insns: List[vm_insns.Insn] | str,
+    params: Iterable[List[str]],
+    engine: str = "interp",
+    memory_size: Optional[int] = None,
+    memory_kind: str = "list",
+    int64: bool = False,
+    jobs: Optional[int] = None,
+    ordered: bool = True,
+) -> Iterator[vm_batch.Result]:
+    # invoke_vm over many argument lists in a process pool; insns may also
+    # be the path of a program for each process to load
+    return vm_batch.run_batch(
+        insns,
+        (numbers(p) for p in params),
+        jobs=jobs,
+        ordered=ordered,
+        engine=engine,
+        memory_size=memory_size,
+        memory_kind=memory_kind,
+        int64=int64,
+    )
+
+
+def dump_insns(
+    insns: List[vm_insns.Insn], program: Optional[vm_link.Program] = None
+) -> None:
     print("Instructions:")
+    pcs: Dict[int, int] = program.pcs() if program else {}
     insn: vm_insns.Insn
     for i, insn in enumerate(insns):
         indent: str = (
@@ -42,4 +82,5 @@ def dump_insns(insns: List[vm_insns.Insn]) -> None:
             else "        "
         )
         dis = insn.disasm(long=False)
-        print(f"[{i:5}] {indent}{dis}")
+        pc: str = f"{pcs[i]:5}" if i in pcs else " " * 5
+        print(f"[{i:5}] {pc if program else ''}{indent}{dis}")
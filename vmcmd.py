@@ -1,11 +1,25 @@
 import argparse
-from typing import List
-
-from .vm_parser import Parser
-from .scanner import Scanner
+import json
+import sys
+from typing import Iterable, Iterator, List, Optional, TextIO
 
 # from vm_insns
 from .vm_utils import dump_insns
+from . import (
+    vm_batch,
+    vm_binary,
+    vm_cache,
+    vm_inline,
+    vm_lanes,
+    vm_limits,
+    vm_memory,
+    vm_optimize,
+    vm_output,
+    vm_peephole,
+    vm_stream,
+    vm_trace,
+    vm_transpile,
+)
 from .vm import *
 
 
@@ -16,30 +30,389 @@ def get_args():
     )
     ap.add_argument("--file", type=str, required=True, help="The file to run")
     ap.add_argument("--verbose", action="store_true", help="verbose output")
-    return ap.parse_args()
+    ap.add_argument(
+        "--engine",
+        choices=engines,
+        default="interp",
+        help="execution engine",
+    )
+    ap.add_argument(
+        "--memory",
+        choices=vm_memory.kinds,
+        default="list",
+        help="memory representation",
+    )
+    ap.add_argument(
+        "--memory-size",
+        type=int,
+        help="number of memory cells (default: args + 100000,"
+        f" {vm_lanes.default_size} per lane with --lanes, or unlimited for"
+        " paged memory)",
+    )
+    ap.add_argument(
+        "--page-size",
+        type=int,
+        default=vm_memory.default_page_size,
+        help="cells per page of paged memory",
+    )
+    ap.add_argument(
+        "--int64",
+        action="store_true",
+        help="wrap arithmetic to 64 bits (compiled engine)",
+    )
+    ap.add_argument(
+        "--output",
+        choices=vm_output.kinds,
+        help="how print writes values: a line each, buffered lines, or"
+        " buffered raw int64s (default: print, or text with --output-file)",
+    )
+    ap.add_argument(
+        "--output-file",
+        metavar="PATH",
+        help="write printed values to PATH instead of stdout",
+    )
+    ap.add_argument(
+        "--output-buffer",
+        type=int,
+        default=vm_output.default_buffer,
+        help="values buffered before a write",
+    )
+    ap.add_argument(
+        "--max-steps",
+        type=int,
+        help="stop with an error after this many instructions",
+    )
+    ap.add_argument(
+        "--timeout",
+        type=float,
+        help="stop with an error after this many seconds",
+    )
+    ap.add_argument(
+        "--max-cells",
+        type=int,
+        help="stop with an error once paged memory holds more cells than"
+        " this",
+    )
+    ap.add_argument(
+        "--limit-interval",
+        type=int,
+        default=vm_limits.default_interval,
+        help="instructions run between checks of the limits",
+    )
+    ap.add_argument(
+        "--transpile",
+        action="store_true",
+        help="run the program as a cached, transpiled Python module",
+    )
+    ap.add_argument(
+        "--cache-dir",
+        default=vm_cache.default_dir,
+        help="directory for cached programs",
+    )
+    ap.add_argument(
+        "--cache",
+        action="store_true",
+        help="cache the parsed program in binary form",
+    )
+    ap.add_argument(
+        "--cache-limit",
+        type=int,
+        default=vm_cache.default_limit,
+        help="size in bytes the cache directory is trimmed to",
+    )
+    ap.add_argument(
+        "--emit",
+        metavar="PATH",
+        help="write the parsed program in binary form to PATH and exit",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the run and report to stderr",
+    )
+    ap.add_argument(
+        "--profile-json",
+        metavar="PATH",
+        help="profile the run and write the results to PATH as JSON",
+    )
+    ap.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="record the last steps of the run in a trace file at PATH",
+    )
+    ap.add_argument(
+        "--trace-steps",
+        type=int,
+        default=vm_trace.default_capacity,
+        help="number of steps the trace file holds",
+    )
+    ap.add_argument(
+        "--inline",
+        action="store_true",
+        help="inline small subroutines into their call sites",
+    )
+    ap.add_argument(
+        "--inline-size",
+        type=int,
+        default=16,
+        help="largest subroutine, in instructions, that is inlined",
+    )
+    ap.add_argument(
+        "--inline-budget",
+        type=int,
+        default=256,
+        help="most instructions inlining may add to the program",
+    )
+    ap.add_argument(
+        "--inline-stats",
+        action="store_true",
+        help="report what inlining did to stderr",
+    )
+    ap.add_argument(
+        "--optimize",
+        action="store_true",
+        help="run the global optimizer before executing",
+    )
+    ap.add_argument(
+        "--optimize-stats",
+        action="store_true",
+        help="report what the global optimizer rewrote to stderr",
+    )
+    ap.add_argument(
+        "--verify",
+        action="store_true",
+        help="run the program before and after optimizing and check that"
+        " they agree",
+    )
+    ap.add_argument(
+        "--peephole",
+        action="store_true",
+        help="run the peephole optimizer before executing",
+    )
+    ap.add_argument(
+        "--peephole-stats",
+        action="store_true",
+        help="report what the peephole optimizer rewrote to stderr",
+    )
+    ap.add_argument(
+        "--batch",
+        metavar="PATH",
+        help="run once per line of PATH ('-' for stdin), each a list of"
+        " arguments, and write a JSON line per run",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        help="processes for --batch (default: one per CPU)",
+    )
+    ap.add_argument(
+        "--lanes",
+        action="store_true",
+        help="run --batch in lockstep NumPy lanes in this process",
+    )
+    ap.add_argument(
+        "--lane-width",
+        type=int,
+        default=vm_lanes.default_width,
+        help="argument vectors per lockstep run",
+    )
+    ap.add_argument(
+        "--unordered",
+        action="store_true",
+        help="write --batch results as they complete",
+    )
+    args = ap.parse_args()
+    if args.output is None:
+        args.output = "text" if args.output_file else "print"
+    elif args.output == "print" and args.output_file:
+        ap.error("print output goes to stdout only")
+    if limits(args) is not None:
+        # these run without checking limits
+        unchecked = [
+            ("--verbose", args.verbose),
+            ("--profile", args.profile or args.profile_json),
+            ("--trace", args.trace),
+            ("--transpile", args.transpile),
+            ("--lanes", args.lanes),
+            ("--verify", args.verify),
+        ]
+        for flag, given in unchecked:
+            if given:
+                ap.error(
+                    f"{flag} cannot be combined with --max-steps, --timeout"
+                    " or --max-cells"
+                )
+    return args
 
 
-def main():
-    args = get_args()
-    fname = args.file
-    with open(fname) as f:
-        input = f.read()
-    lexer = Scanner(input, reserved=reserved)
-    psr = Parser(lexer)
-    insns: List[Insn] = psr.parse()
+def vectors(f: TextIO) -> Iterator[List[int]]:
+    for line in f:
+        if line.strip():
+            yield [int(arg) for arg in line.split()]
 
-    if args.verbose:
-        dump_insns(insns)
 
-    params = list(reversed(args.args)) + [0]  # w/ space for return value
-    exe = Execution(
-        insns,
-        params + [0] * 100000,
-        {"SP": len(params)},
+def limits(args: argparse.Namespace) -> Optional[vm_limits.Limits]:
+    if (args.max_steps, args.timeout, args.max_cells) == (None, None, None):
+        return None
+    return vm_limits.Limits(
+        args.max_steps, args.timeout, args.max_cells, args.limit_interval
     )
+
+
+def run_batch(args: argparse.Namespace, insns: List[Insn]) -> None:
+    f = sys.stdin if args.batch == "-" else open(args.batch)
+    with f:
+        if args.lanes:
+            first = 0
+            for chunk in vm_batch.chunks(vectors(f), args.lane_width):
+                for result in vm_lanes.run_lanes(
+                    insns, chunk, args.memory_size
+                ):
+                    result = result._replace(position=first + result.position)
+                    print(json.dumps(result._asdict()))
+                first += len(chunk)
+            return
+        for result in vm_batch.run_batch(
+            insns,
+            vectors(f),
+            jobs=args.jobs,
+            ordered=not args.unordered,
+            engine=args.engine,
+            memory_size=args.memory_size,
+            memory_kind=args.memory,
+            page_size=args.page_size,
+            int64=args.int64,
+            limits=limits(args),
+        ):
+            print(json.dumps(result._asdict()))
+
+
+def run(args: argparse.Namespace, exe: Execution) -> None:
+    if args.verbose:
+        dump_insns(exe.insns, exe.program)
     exe.verbose = args.verbose
+    exe.limits = limits(args)
+    if args.profile or args.profile_json:
+        profile = exe.run_profiled()
+        if args.profile:
+            profile.report(sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, "w") as f:
+                json.dump(profile.to_json(), f, indent=1)
+        return
+    if args.trace:
+        tracer = vm_trace.Tracer(args.trace_steps, args.trace)
+        try:
+            exe.run_traced(tracer)
+        finally:
+            tracer.close()
+        return
     exe.run()
 
 
+def main():
+    args = get_args()
+    fname = args.file
+    with open(fname, "rb") as f:
+        binary = vm_binary.is_binary(f.read(len(vm_binary.magic)))
+    params = list(reversed(args.args)) + [0]  # w/ space for return value
+    memory = vm_memory.allocate(
+        params, args.memory_size, args.memory, args.page_size
+    )
+
+    if args.transpile:
+        if binary:
+            raise Exception("--transpile needs a source program")
+        with open(fname) as f:
+            input = f.read()
+        module = vm_transpile.cached_module(
+            input, args.cache_dir, args.cache_limit, args.int64
+        )
+        output = vm_output.sink(
+            args.output, args.output_file, args.output_buffer
+        )
+        try:
+            vm_transpile.execute(module, memory, {"SP": len(params)}, output)
+        finally:
+            output.close()
+        return
+
+    program: Iterable[Insn]
+    if binary:
+        with open(fname, "rb") as f:
+            program = vm_binary.loads(f.read())
+    elif args.cache:
+        with open(fname) as f:
+            input = f.read()
+        program = vm_binary.cached_insns(
+            input, args.cache_dir, args.cache_limit
+        )
+    else:
+        program = vm_stream.parse_path(fname)
+
+    original: List[Insn] = []
+    if args.verify:
+        program = original = list(program)
+
+    if args.inline:
+        inliner = vm_inline.Inliner(args.inline_size, args.inline_budget)
+        program = inliner.run(list(program))
+        if args.inline_stats:
+            for name, count in sorted(inliner.stats.items()):
+                print(f"inline: {name:16} {count}", file=sys.stderr)
+
+    if args.optimize:
+        optimizer = vm_optimize.Optimizer()
+        program = optimizer.run(list(program))
+        if args.optimize_stats:
+            for name, count in sorted(optimizer.stats.items()):
+                print(f"optimize: {name:16} {count}", file=sys.stderr)
+
+    if args.peephole:
+        peephole = vm_peephole.Peephole()
+        program = peephole.run(list(program))
+        if args.peephole_stats:
+            for name, count in sorted(peephole.stats.items()):
+                print(f"peephole: {name:16} {count}", file=sys.stderr)
+
+    if args.emit:
+        with open(args.emit, "wb") as f:
+            vm_binary.dump(program, f, comments=True)
+        return
+
+    insns: List[Insn] = list(program)
+    if args.batch:
+        run_batch(args, insns)
+        return
+    if args.verify:
+        outcome = vm_optimize.verify(
+            original,
+            insns,
+            lambda: vm_memory.allocate(
+                params, args.memory_size, args.memory, args.page_size
+            ),
+            {"SP": len(params)},
+            engine=args.engine,
+            int64=args.int64,
+        )
+        sys.stdout.write(outcome.output)
+        if outcome.raised is not None:
+            raise outcome.raised
+        return
+    output = vm_output.sink(args.output, args.output_file, args.output_buffer)
+    try:
+        exe = Execution(
+            insns,
+            memory,
+            {"SP": len(params)},
+            engine=args.engine,
+            int64=args.int64,
+            output=output,
+        )
+        run(args, exe)
+    finally:
+        output.close()
+
+
 if __name__ == "__main__":
     main()
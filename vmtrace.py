@@ -0,0 +1,42 @@
+import argparse
+import sys
+
+from . import vm_binary, vm_link, vm_stream, vm_trace
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Decode a VM trace")
+    ap.add_argument("trace", help="trace file written by vmcmd --trace")
+    ap.add_argument(
+        "--file",
+        required=True,
+        help="the traced program; after --inline, --optimize or --peephole,"
+        " the one vmcmd --emit wrote with the same options",
+    )
+    ap.add_argument("--last", type=int, help="only the last LAST steps")
+    ap.add_argument(
+        "--state",
+        action="store_true",
+        help="show registers and frames as far as they are known",
+    )
+    args = ap.parse_args()
+    with open(args.file, "rb") as f:
+        data = f.read()
+    if vm_binary.is_binary(data):
+        insns = vm_binary.loads(data)
+    else:
+        insns = list(vm_stream.parse_path(args.file))
+    traced, trace = vm_trace.load(args.trace)
+    program = vm_link.link(insns)
+    if vm_trace.digest(program) != traced:
+        raise Exception(
+            f"{args.file} is not the program traced in {args.trace}; if it"
+            " ran transformed, pass the program vmcmd --emit writes with the"
+            " same options"
+        )
+    skip = 0 if args.last is None else max(0, len(trace) - args.last)
+    vm_trace.replay(trace, insns, program, sys.stdout, args.state, skip)
+
+
+if __name__ == "__main__":
+    main()